@@ -41,7 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     "rest_framework",
     "guardian",
-    'users'
+    'users.apps.UsersConfig',
 ]
 
 
@@ -50,29 +50,56 @@ GUARDIAN_MONKEY_PATCH = False
 GUARDIAN_GET_INIT_ANONYMOUS_USER = "users.models.get_anonymous_user_instance"
 ANONYMOUS_USER_NAME = "Anonymous@anonymous.com"
 
-AUTHENTICATION_BACKENDS = {
+# Order matters: the implicit rules answer the common checks before guardian queries its tables.
+AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
-    "guardian.backends.ObjectPermissionBackend"
-}
+    "users.backends.ImplicitObjectPermissionBackend",
+    # guardian's backend with the anonymous user kept in memory
+    "users.backends.ObjectPermissionBackend",
+]
+
+# guardian looks for its backend by path and misses the subclass above
+SILENCED_SYSTEM_CHECKS = ["guardian.W001"]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # first, so the session and user lookups count towards the request
+    'users.metrics.MetricsMiddleware',
+    # outside the session middleware, so saving a session counts as a write
+    'users.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # last, so it covers the whole view and knows the user
+    'users.profiling.ProfilingMiddleware',
 ]
 
+# Requests with an X-Profile header from users.profiling.make_profile_token(),
+# or ?profile from staff, are profiled and reported to USERS_PROFILE_DIR.
+USERS_PROFILE_DIR = os.environ.get('USERS_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+USERS_PROFILE_TOKEN_MAX_AGE = 3600
+USERS_PROFILE_SUMMARY_HEADER = True
+
+# Worker processes write their metrics to this directory and /metrics/ sums
+# them, see users.metrics. Unset, /metrics/ shows the serving process only.
+USERS_METRICS_DIR = os.environ.get('USERS_METRICS_DIR')
+USERS_METRICS_FLUSH_INTERVAL = 1
+
 # Rest Framework Settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework.authentication.SessionAuthentication",
+        "users.tokens.SignedTokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAdminUser",),
 }
 
+# Seconds a token from POST /tokens/ is valid for; see users.tokens.
+USERS_TOKEN_MAX_AGE = 300
+
 ROOT_URLCONF = 'project.urls'
 
 TEMPLATES = [
@@ -101,9 +128,74 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # a copy of default kept up to date by replication; tests read default
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get(
+            'USERS_REPLICA_NAME', os.path.join(BASE_DIR, 'db.replica.sqlite3')
+        ),
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# Requests that only read send their queries to this alias, see users.routers.
+# Unset, everything goes to default. Clients that wrote read from default for
+# USERS_PIN_PRIMARY_SECONDS, which should exceed the replication lag.
+USERS_READ_DATABASE = os.environ.get('USERS_READ_DATABASE')
+USERS_PIN_PRIMARY_SECONDS = 5
+
+DATABASE_ROUTERS = ['users.routers.ReplicaRouter']
+
+
+# Caches
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# The default cache holds whether access tokens were revoked, the versions of
+# the users cached for sessions and tokens, and the user list version behind
+# its ETags.
+# It must be shared by all worker processes in production (memcached, redis):
+# a worker with its own cache accepts revoked tokens, keeps deactivated users
+# for up to USERS_AUTH_CACHE_TIMEOUT and serves stale lists indefinitely. The
+# users.E004 check refuses locmem unless USERS_LOCAL_CACHES_ALLOWED is set.
+# Resolved object permissions are cached in their own alias, whose TIMEOUT and
+# MAX_ENTRIES bound how long and how many entries are kept. Changes to grants,
+# groups and users are seen at once by every worker sharing that cache. With a
+# process-local cache such as locmem, other workers keep answering from stale
+# entries for up to its TIMEOUT, so the users.E002 check refuses it unless
+# USERS_LOCAL_CACHES_ALLOWED is set, as it is while DEBUG.
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "permissions": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "permissions",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
 }
 
+USERS_PERMISSION_CACHE = "permissions"
+
+# Allow process-local caches, fine for runserver and tests only.
+USERS_LOCAL_CACHES_ALLOWED = DEBUG
+
+# Sessions are read from the default cache and written through to the database.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Seconds a session's user is kept in the default cache, see users.authentication.
+USERS_AUTH_CACHE_TIMEOUT = 300
+
+
+# Jobs queued by users.jobs are run by `manage.py run_jobs`. Failing jobs are
+# retried after USERS_JOB_RETRY_DELAY seconds, doubled on every attempt.
+USERS_JOB_MAX_ATTEMPTS = 5
+USERS_JOB_RETRY_DELAY = 60
+# seconds after which a job whose worker died is run again
+USERS_JOB_TIMEOUT = 600
+
+# Queue a welcome email to every new user.
+USERS_WELCOME_EMAIL = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -124,6 +216,32 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/2.2/topics/auth/passwords/
+
+# The tuned hasher reads its iteration count from USERS_PBKDF2_ITERATIONS, which
+# `manage.py calibrate_password_hashers --output project/password_hashing.py`
+# measures for the machine it runs on, never below Django's default. Existing
+# hashes with fewer iterations are upgraded on login, stronger ones are kept.
+PASSWORD_HASHERS = [
+    "users.hashers.TunedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+
+USERS_PBKDF2_ITERATIONS = 150000
+
+# Processes used to hash passwords when users are created in bulk; 1 hashes
+# in the calling process.
+USERS_PASSWORD_HASH_WORKERS = int(os.environ.get("USERS_PASSWORD_HASH_WORKERS", 1))
+
+try:
+    from .password_hashing import *  # noqa: F401,F403
+except ImportError:
+    pass
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
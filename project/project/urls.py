@@ -2,12 +2,15 @@ from django.conf.urls import url, include
 from django.contrib import admin
 from django.urls import path
 from rest_framework.routers import SimpleRouter
-from users.views import CustomUserViewSet
+from users.views import CustomUserViewSet, GrantViewSet, MetricsView, TokenViewSet
 
 router = SimpleRouter()
 router.register(r"users", CustomUserViewSet, basename="user")
+router.register(r"grants", GrantViewSet, basename="grant")
+router.register(r"tokens", TokenViewSet, basename="token")
 
 urlpatterns = [
     url(r"^", include(router.urls)),
     path('admin/', admin.site.urls),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 ]
@@ -1,11 +1,19 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Prefetch
+from django.utils.translation import ugettext_lazy as _
+from guardian.admin import GuardedModelAdminMixin
 
 from .forms import CustomUserChangeForm, CustomUserCreationForm
-from .models import CustomUser
+from .models import (
+    CustomUser,
+    CustomUserGroupObjectPermission,
+    CustomUserUserObjectPermission,
+)
+from .pagination import EstimatedCountPaginator
 
 
-class CustomUserAdmin(BaseUserAdmin):
+class CustomUserAdmin(GuardedModelAdminMixin, BaseUserAdmin):
     # The forms to add and change user instances
     form = CustomUserChangeForm
     add_form = CustomUserCreationForm
@@ -13,7 +21,7 @@ class CustomUserAdmin(BaseUserAdmin):
     # The fields to be used in displaying the User model.
     # These override the definitions on the base UserAdmin
     # that reference specific fields on auth.User.
-    list_display = ("email", "is_superuser")
+    list_display = ("email", "is_superuser", "object_grants")
     list_filter = ("is_superuser",)
     fieldsets = (
         (None, {"fields": ("email", "password")}),
@@ -30,5 +38,56 @@ class CustomUserAdmin(BaseUserAdmin):
     ordering = ("email",)
     filter_horizontal = ()
 
+    # count the changelist once, and only up to EstimatedCountPaginator.count_limit
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # grants of the displayed page in two queries, not two per row
+        return (
+            super()
+            .get_queryset(request)
+            .prefetch_related(
+                Prefetch(
+                    "user_grants",
+                    queryset=CustomUserUserObjectPermission.objects.select_related(
+                        "user", "permission"
+                    ),
+                ),
+                Prefetch(
+                    "group_grants",
+                    queryset=CustomUserGroupObjectPermission.objects.select_related(
+                        "group", "permission"
+                    ),
+                ),
+            )
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Matches whole addresses exactly and anything else as a prefix of the
+        email, ignoring case, which the unique index on ``email_lower`` can
+        answer without a table scan.
+        """
+        term = search_term.strip().lower()
+        if not term:
+            return queryset, False
+        if "@" in term:
+            return queryset.filter(email_lower=term), False
+        return queryset.filter(email_lower__startswith=term), False
+
+    def object_grants(self, obj):
+        grants = [
+            f"{grant.user.email}: {grant.permission.codename}"
+            for grant in obj.user_grants.all()
+        ]
+        grants += [
+            f"{grant.group.name}: {grant.permission.codename}"
+            for grant in obj.group_grants.all()
+        ]
+        return ", ".join(grants) or "-"
+
+    object_grants.short_description = _("object permissions")
+
 
 admin.site.register(CustomUser, CustomUserAdmin)
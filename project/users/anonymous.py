@@ -0,0 +1,112 @@
+"""
+Keeps guardian's anonymous user and what it may do in process memory.
+
+guardian answers for unauthenticated requests with the ``CustomUser`` named by
+``ANONYMOUS_USER_NAME``, which it looks up on every check. The entry kept here
+holds that instance, its model permissions and whether it holds any object
+grants, and is tagged with the versions ``users.authentication`` and
+``users.permission_cache`` replace whenever the row, its grants or its groups
+change. Checking those versions takes a cache round trip, not a query. Like
+the permission cache, the entry is not used inside transactions, nor kept when
+read from the replica.
+
+Model permissions given to or taken from the anonymous user or its groups are
+picked up through the versions ``users.models`` replaces on ``m2m_changed``,
+from either side of the relation.
+"""
+
+import copy
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.db import connection
+
+from . import permission_cache
+from .authentication import get_user_version
+from .models import (
+    CustomUser,
+    CustomUserGroupObjectPermission,
+    CustomUserUserObjectPermission,
+)
+from .routers import is_reading_from_replica
+
+Entry = namedtuple("Entry", "user signature perms has_object_grants")
+
+_entry = {}
+
+
+def get_signature(user):
+    return f"{get_user_version(user.pk)}:{permission_cache.get_signature(user)}"
+
+
+def load_entry():
+    try:
+        user = CustomUser.objects.get(email=settings.ANONYMOUS_USER_NAME)
+    except CustomUser.DoesNotExist:
+        return None
+    # read before the grants, so changes made meanwhile replace the entry
+    signature = get_signature(user)
+    perms = frozenset(ModelBackend().get_all_permissions(user))
+    has_object_grants = (
+        CustomUserUserObjectPermission.objects.filter(user_id=user.pk).exists()
+        or CustomUserGroupObjectPermission.objects.filter(
+            group__in=user.groups.all()
+        ).exists()
+    )
+    return Entry(user, signature, perms, has_object_grants)
+
+
+def get_entry():
+    """
+    Returns the ``Entry`` of guardian's anonymous user, or ``None`` when there is no such user.
+    """
+    if settings.ANONYMOUS_USER_NAME is None:
+        return None
+    if connection.in_atomic_block:
+        return load_entry()
+    entry = _entry.get("anonymous")
+    if entry is not None and entry.signature == get_signature(entry.user):
+        return entry
+    entry = load_entry()
+    if entry is not None and not is_reading_from_replica():
+        # a lagging replica's copy would be kept under the new signature
+        _entry["anonymous"] = entry
+    return entry
+
+
+def clear():
+    _entry.clear()
+
+
+def get_anonymous_user():
+    """
+    Returns a copy of guardian's anonymous ``CustomUser``, or ``None``.
+    """
+    entry = get_entry()
+    return copy.copy(entry.user) if entry is not None else None
+
+
+def resolve_user(user):
+    """
+    Returns ``user``, or guardian's anonymous user in place of an unauthenticated one.
+    """
+    if user.is_authenticated:
+        return user
+    return get_anonymous_user() or user
+
+
+def has_perms(perms):
+    """
+    Returns whether guardian's anonymous user holds all the model permissions ``perms``.
+    """
+    entry = get_entry()
+    return entry is not None and all(perm in entry.perms for perm in perms)
+
+
+def has_object_grants():
+    """
+    Returns whether guardian's anonymous user holds object permissions on any user.
+    """
+    entry = get_entry()
+    return entry is not None and entry.has_object_grants
@@ -1,5 +1,25 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def refresh_catalog(sender, using, **kwargs):
+    from .catalog import catalog
+
+    catalog.warm(using)
+
+
+def ensure_admins_group_perms(sender, using, **kwargs):
+    from .models import assign_admins_group_perms
+
+    assign_admins_group_perms(using)
 
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+
+        # runs after auth has created the permissions for this app
+        post_migrate.connect(refresh_catalog, sender=self)
+        post_migrate.connect(ensure_admins_group_perms, sender=self)
@@ -0,0 +1,106 @@
+"""
+Resolves the user of a session from the cache instead of the database.
+
+Entries are keyed by session and user id and carry the version of the user
+they were loaded at. Receivers in ``users.models`` replace that version when a
+user is saved or deleted, which includes password changes, so stale entries
+are never used. Together with ``cached_db`` sessions an authenticated request
+reaches the view without a query. Versions are only seen by workers sharing
+the default cache, see ``users.checks``. Users are always loaded from the
+primary, and ``CustomUserQuerySet.update`` and ``bulk_update`` replace the
+versions of the rows they write.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY,
+    HASH_SESSION_KEY,
+    _get_user_session_key,
+    load_backend,
+)
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.crypto import constant_time_compare
+
+from .routers import reading_from_primary
+
+
+def version_key(pk):
+    """
+    Returns the cache key of the version replaced whenever the user with ``pk`` changes.
+    """
+    return f"users:auth:version:{pk}"
+
+
+def _entry_key(session_key, pk):
+    return f"users:auth:{session_key}:{pk}"
+
+
+def _bump(keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def invalidate_cached_users(*pks):
+    keys = [version_key(pk) for pk in pks]
+    if not keys:
+        return
+    _bump(keys)
+    if connection.in_atomic_block:
+        # an entry loaded before the commit holds the old row
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def get_user_version(pk):
+    key = version_key(pk)
+    cache.add(key, uuid.uuid4().hex, timeout=None)
+    return cache.get(key)
+
+
+def get_cached_user(session_key, user_id, backend_path):
+    """
+    Returns the user ``backend_path`` resolves ``user_id`` to, from the cache if possible.
+    """
+    user_version_key = version_key(user_id)
+    entry_key = _entry_key(session_key, user_id)
+    cached = cache.get_many([user_version_key, entry_key])
+    version = cached.get(user_version_key)
+    if version is None:
+        version = get_user_version(user_id)
+    elif entry_key in cached and cached[entry_key][0] == version:
+        return cached[entry_key][1]
+
+    # a lagging replica's copy would be kept under the version read above
+    with reading_from_primary():
+        user = load_backend(backend_path).get_user(user_id)
+    if user is not None:
+        cache.set(entry_key, (version, user), settings.USERS_AUTH_CACHE_TIMEOUT)
+    return user
+
+
+def get_user(request):
+    """
+    Same as ``django.contrib.auth.get_user``, but served from the cache.
+    """
+    try:
+        user_id = _get_user_session_key(request)
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    user = get_cached_user(request.session.session_key, user_id, backend_path)
+    if user is None:
+        return AnonymousUser()
+    # a password change invalidates the other sessions of the user
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not (
+        session_hash
+        and constant_time_compare(session_hash, user.get_session_auth_hash())
+    ):
+        request.session.flush()
+        return AnonymousUser()
+    return user
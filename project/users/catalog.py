@@ -0,0 +1,74 @@
+"""
+In-process catalog of the ``ContentType``, ``Permission`` and ``Group`` ids
+that the user write paths and permission checks keep resolving.
+
+It is filled on first use, so loading the app never touches the database,
+and refreshed after every migration.
+"""
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+class PermissionCatalog:
+    def __init__(self):
+        self._ids = None
+
+    def clear(self):
+        self._ids = None
+
+    def warm(self, using=None):
+        content_type = ContentType.objects.db_manager(using).get_for_model(
+            get_user_model()
+        )
+        permission_ids = dict(
+            Permission.objects.using(using)
+            .filter(content_type=content_type)
+            .values_list("codename", "pk")
+        )
+        admins_group_id = (
+            Group.objects.using(using)
+            .filter(name="admins")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        self._ids = {
+            "content_type": content_type.pk,
+            "permissions": permission_ids,
+            "admins_group": admins_group_id,
+        }
+
+    def _get(self, name):
+        if self._ids is None:
+            self.warm()
+        return self._ids[name]
+
+    @property
+    def content_type_id(self):
+        return self._get("content_type")
+
+    @property
+    def admins_group_id(self):
+        admins_group_id = self._get("admins_group")
+        if admins_group_id is None:
+            raise Group.DoesNotExist("The admins group does not exist.")
+        return admins_group_id
+
+    def permission_id(self, codename):
+        """Returns the id of the ``codename`` permission on users."""
+        return self._get("permissions")[codename]
+
+    def permission_ids(self, codenames):
+        return [self.permission_id(codename) for codename in codenames]
+
+
+catalog = PermissionCatalog()
+
+
+@receiver([post_save, post_delete], sender=Group)
+def admins_group_changed(sender, instance, **kwargs):
+    if instance.name == "admins":
+        catalog.clear()
@@ -0,0 +1,132 @@
+from django.contrib.auth.models import Permission
+from django.utils.encoding import force_text
+from guardian.core import ObjectPermissionChecker, _get_pks_model_and_ctype
+from guardian.ctypes import get_content_type
+from guardian.utils import get_group_obj_perms_model, get_user_obj_perms_model
+
+from . import permission_cache
+from .backends import has_implicit_perm
+
+
+class CustomUserPermissionChecker(ObjectPermissionChecker):
+    """
+    ``ObjectPermissionChecker`` that applies the implicit rules of
+    ``users.backends`` before looking at stored grants, and fetches user and
+    group grants together in a single round trip. Grants resolved for a user
+    are shared across requests through ``users.permission_cache``.
+    """
+
+    def has_perm(self, perm, obj):
+        if self.user and not self.user.is_active:
+            return False
+        elif self.user and self.user.is_superuser:
+            return True
+        if "." in perm:
+            _, perm = perm.split(".", 1)
+        if self.user and has_implicit_perm(self.user, perm, obj):
+            return True
+        return perm in self.get_perms(obj)
+
+    def has_perms(self, perms, obj):
+        return all(self.has_perm(perm, obj) for perm in perms)
+
+    def use_shared_cache(self):
+        return self.user is not None and permission_cache.is_enabled()
+
+    def get_cache_signature(self):
+        if not hasattr(self, "_cache_signature"):
+            self._cache_signature = permission_cache.get_signature(self.user)
+        return self._cache_signature
+
+    def get_cached_perms(self, ctype_id, pks):
+        """
+        Copies the entries of the shared cache for ``pks`` into the local
+        cache and returns the pks that were not found.
+        """
+        if not self.use_shared_cache():
+            return pks
+        cached = permission_cache.get_perms(
+            self.user, self.get_cache_signature(), ctype_id, pks
+        )
+        for pk, codenames in cached.items():
+            self._obj_perms_cache[(ctype_id, pk)] = codenames
+        return [pk for pk in pks if pk not in cached]
+
+    def set_cached_perms(self, ctype_id, perms):
+        if self.use_shared_cache():
+            permission_cache.set_perms(
+                self.user, self.get_cache_signature(), ctype_id, perms
+            )
+
+    def get_perms(self, obj):
+        if self.user and not self.user.is_active:
+            return []
+        if self.user and self.user.is_superuser:
+            return super().get_perms(obj)
+
+        key = self.get_local_cache_key(obj)
+        ctype_id, pk = key
+        if key not in self._obj_perms_cache and self.get_cached_perms(ctype_id, [pk]):
+            # compound statements can't carry Permission's default ordering
+            perms_qs = Permission.objects.filter(
+                content_type=get_content_type(obj)
+            ).order_by()
+            perms = perms_qs.filter(**self.get_group_filters(obj)).values_list(
+                "codename", flat=True
+            )
+            if self.user:
+                user_perms = perms_qs.filter(**self.get_user_filters(obj)).values_list(
+                    "codename", flat=True
+                )
+                perms = user_perms.union(perms)
+            self._obj_perms_cache[key] = list(perms)
+            self.set_cached_perms(ctype_id, {pk: self._obj_perms_cache[key]})
+        return self._obj_perms_cache[key]
+
+    def prefetch_perms(self, objects):
+        """
+        Prefetches the user and group grants on ``objects``, with one query
+        for those missing from the shared cache.
+        """
+        if self.user and not self.user.is_active:
+            return []
+        if self.user and self.user.is_superuser:
+            return super().prefetch_perms(objects)
+        if not objects:
+            return True
+
+        pks, model, ctype = _get_pks_model_and_ctype(objects)
+        pks = self.get_cached_perms(ctype.id, pks)
+        if not pks:
+            return True
+
+        group_model = get_group_obj_perms_model(model)
+        if self.user:
+            grants = self._grants(group_model, ctype, pks, group__user=self.user)
+            user_model = get_user_obj_perms_model(model)
+            grants = self._grants(user_model, ctype, pks, user=self.user).union(grants)
+        else:
+            grants = self._grants(group_model, ctype, pks, group=self.group)
+
+        perms = {pk: [] for pk in pks}
+        for pk, codename in grants:
+            perms[force_text(pk)].append(codename)
+        for pk, codenames in perms.items():
+            self._obj_perms_cache[(ctype.id, pk)] = codenames
+        self.set_cached_perms(ctype.id, perms)
+        return True
+
+    @staticmethod
+    def _grants(model, ctype, pks, **filters):
+        """
+        Returns ``(object pk, codename)`` pairs of the grants in ``model`` on ``pks``.
+        """
+        if model.objects.is_generic():
+            grants = model.objects.filter(
+                content_type=ctype, object_pk__in=pks, **filters
+            )
+            return grants.order_by().values_list("object_pk", "permission__codename")
+        grants = model.objects.filter(content_object_id__in=pks, **filters)
+        return grants.order_by().values_list(
+            "content_object_id", "permission__codename"
+        )
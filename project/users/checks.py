@@ -0,0 +1,74 @@
+"""
+System checks for the settings the users app depends on.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, register
+
+# backends whose entries live in one process, unseen by the others
+LOCAL_CACHE_BACKENDS = ("django.core.cache.backends.locmem.LocMemCache",)
+# backends that keep nothing, sending every request to the database
+DUMMY_CACHE_BACKENDS = ("django.core.cache.backends.dummy.DummyCache",)
+
+
+def is_local(alias):
+    return settings.CACHES[alias]["BACKEND"] in LOCAL_CACHE_BACKENDS
+
+
+@register()
+def check_permission_cache(app_configs, **kwargs):
+    """
+    Versions are replaced in the worker that handled a change only, so a
+    process-local permission cache keeps revoked grants in the others.
+    """
+    if settings.USERS_LOCAL_CACHES_ALLOWED:
+        return []
+    alias = settings.USERS_PERMISSION_CACHE
+    if alias not in settings.CACHES:
+        return [
+            Error(
+                f"USERS_PERMISSION_CACHE names the cache {alias!r}, which is not in CACHES.",
+                id="users.E001",
+            )
+        ]
+    if is_local(alias):
+        return [
+            Error(
+                f"The {alias!r} cache holding resolved object permissions is local to each process.",
+                hint=(
+                    "Point it at a cache shared by all workers, such as memcached, "
+                    "or set USERS_LOCAL_CACHES_ALLOWED if only one process serves requests."
+                ),
+                id="users.E002",
+            )
+        ]
+    return []
+
+
+@register()
+def check_default_cache(app_configs, **kwargs):
+    """
+    The default cache holds whether tokens were revoked, the versions of cached
+    session users and the user list version; a worker that doesn't share it
+    keeps accepting revoked tokens and serving stale users and lists.
+    """
+    if settings.CACHES["default"]["BACKEND"] in DUMMY_CACHE_BACKENDS:
+        return [
+            Error(
+                "The default cache keeps nothing, so every token and session is looked up in the database.",
+                hint="Point it at a cache shared by all workers, such as memcached.",
+                id="users.E003",
+            )
+        ]
+    if settings.USERS_LOCAL_CACHES_ALLOWED or not is_local("default"):
+        return []
+    return [
+        Error(
+            "The default cache holding token revocation answers and user versions is local to each process.",
+            hint=(
+                "Point it at a cache shared by all workers, such as memcached, "
+                "or set USERS_LOCAL_CACHES_ALLOWED if only one process serves requests."
+            ),
+            id="users.E004",
+        )
+    ]
@@ -0,0 +1,46 @@
+"""
+Validators for conditional GETs of users.
+
+Single users are validated by their ``modified`` timestamp. The list is
+validated by a table-level version which is replaced whenever a user is saved
+or deleted, or grants and group memberships change. The version lives in the
+default cache, which must be shared by all worker processes. Lists read from
+the replica are sent without validators, as their rows may predate the version.
+"""
+
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+LIST_VERSION_KEY = "users:list:version"
+
+
+def _new_list_version():
+    version = (uuid.uuid4().hex, timezone.now())
+    cache.set(LIST_VERSION_KEY, version, None)
+    return version
+
+
+def get_list_version():
+    """
+    Returns a ``(token, last modified)`` pair for the user list.
+    """
+    version = cache.get(LIST_VERSION_KEY)
+    if version is None:
+        # a lost version may hide changes, so start over from now
+        version = _new_list_version()
+    return version
+
+
+def bump_list_version():
+    _new_list_version()
+    if connection.in_atomic_block:
+        # responses built while the change was uncommitted are stale too
+        transaction.on_commit(_new_list_version)
+
+
+def make_etag(*parts):
+    return hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
@@ -1,9 +1,30 @@
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
+from django.utils.translation import gettext_lazy as _
 
 
-class CustomUserCreationForm(UserCreationForm):
+class UniqueEmailMixin:
+    """
+    Rejects an email another user already has in any case, which the unique
+    ``email_lower`` column would otherwise only catch on save.
+    """
+
+    def clean_email(self):
+        email = self.cleaned_data.get("email")
+        if not email:
+            return email
+        users = get_user_model().objects.filter(email_lower=email.lower())
+        if self.instance.pk is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            raise forms.ValidationError(
+                _("A user with that email already exists."), code="unique"
+            )
+        return email
+
+
+class CustomUserCreationForm(UniqueEmailMixin, UserCreationForm):
     email = forms.EmailField(max_length=254, help_text="Email is required.")
 
     class Meta:
@@ -11,7 +32,7 @@ class CustomUserCreationForm(UserCreationForm):
         fields = ("email", "password1", "password2")
 
 
-class CustomUserChangeForm(UserChangeForm):
+class CustomUserChangeForm(UniqueEmailMixin, UserChangeForm):
     class Meta:
         model = get_user_model()
         fields = "__all__"
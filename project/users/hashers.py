@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 hasher whose iteration count comes from ``USERS_PBKDF2_ITERATIONS``,
+    as measured by ``manage.py calibrate_password_hashers``.
+
+    It keeps the algorithm name of ``PBKDF2PasswordHasher``, so hashes made with
+    fewer iterations are upgraded on the next successful login. Hashes made with
+    more are kept rather than rehashed down to a lower count.
+    """
+
+    @property
+    def iterations(self):
+        return settings.USERS_PBKDF2_ITERATIONS
+
+    def must_update(self, encoded):
+        algorithm, iterations, salt, hash = encoded.split("$", 3)
+        return int(iterations) < self.iterations
+
+
+def _setup_worker():
+    # spawned workers start without configured settings or app registry
+    import django
+
+    django.setup()
+
+
+def make_passwords(passwords, workers=None):
+    """
+    Returns the hashes of ``passwords``, in order, computed by ``workers``
+    processes (``USERS_PASSWORD_HASH_WORKERS`` by default).
+
+    Hashing is CPU bound and holds the GIL, so threads would not help; unusable
+    passwords (``None``) are cheap and always made in the calling process.
+    """
+    passwords = list(passwords)
+    if workers is None:
+        workers = settings.USERS_PASSWORD_HASH_WORKERS
+    usable = [i for i, password in enumerate(passwords) if password is not None]
+    if workers <= 1 or len(usable) <= 1:
+        return [make_password(password) for password in passwords]
+
+    hashes = [
+        make_password(None) if password is None else None for password in passwords
+    ]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as pool:
+        chunksize = max(1, len(usable) // (workers * 4))
+        encoded = pool.map(
+            make_password, [passwords[i] for i in usable], chunksize=chunksize
+        )
+        for i, password in zip(usable, encoded):
+            hashes[i] = password
+    return hashes
@@ -0,0 +1,156 @@
+"""
+A small job queue in the database, for work a request should not wait for.
+
+``enqueue`` writes a ``Job`` row in the caller's transaction, so a job exists
+exactly when the change that asked for it was committed. ``manage.py
+run_jobs`` claims due jobs with a conditional ``UPDATE``, which lets several
+workers share the table, and runs each in a transaction. A job that raises
+is retried ``USERS_JOB_MAX_ATTEMPTS`` times with a growing delay and then
+kept as failed. Jobs whose worker died are retried after ``USERS_JOB_TIMEOUT``,
+also until ``USERS_JOB_MAX_ATTEMPTS`` attempts were made, so a job that kills
+its worker fails too. Failed jobs are kept until ``run_jobs --prune-failed``
+deletes them. Tasks must be idempotent: a job may run again if its worker
+dies after the task returned but before the job was deleted.
+"""
+
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext as _
+
+from .metrics import jobs_run
+from .models import CustomUser, Job
+
+logger = logging.getLogger("django")
+
+
+def enqueue(task, **kwargs):
+    """
+    Queues a call of ``task``, a function or its dotted path, with JSON serializable ``kwargs``.
+    """
+    if callable(task):
+        task = f"{task.__module__}.{task.__qualname__}"
+    return Job.objects.create(task=task, kwargs=json.dumps(kwargs))
+
+
+def get_due_jobs(now):
+    return Job.objects.filter(
+        Q(status=Job.PENDING)
+        | Q(status=Job.RUNNING, attempts__lt=settings.USERS_JOB_MAX_ATTEMPTS),
+        run_after__lte=now,
+    ).order_by("run_after")
+
+
+def fail_abandoned_jobs(now):
+    """
+    Fails the jobs whose worker stopped during their last attempt, returning
+    how many there were.
+    """
+    abandoned = Job.objects.filter(
+        status=Job.RUNNING,
+        run_after__lte=now,
+        attempts__gte=settings.USERS_JOB_MAX_ATTEMPTS,
+    )
+    failed = 0
+    for job in abandoned:
+        # unless another worker got to it first
+        if Job.objects.filter(
+            pk=job.pk, status=job.status, run_after=job.run_after
+        ).update(
+            status=Job.FAILED,
+            run_after=now,
+            last_error="The worker stopped before the job finished.",
+        ):
+            logger.error(f"Job {job.pk} {job.task} failed for good, its worker stopped")
+            jobs_run.inc(task=job.task, outcome="failed")
+            failed += 1
+    return failed
+
+
+def prune_failed_jobs(before):
+    """
+    Deletes the jobs that failed before ``before``, returning how many there were.
+    """
+    deleted, rows = Job.objects.filter(status=Job.FAILED, run_after__lt=before).delete()
+    return deleted
+
+
+def claim(job, now):
+    """
+    Marks ``job`` as running unless another worker got to it first.
+    """
+    claimed = Job.objects.filter(
+        pk=job.pk, status=job.status, run_after=job.run_after
+    ).update(
+        status=Job.RUNNING,
+        run_after=now + timedelta(seconds=settings.USERS_JOB_TIMEOUT),
+        attempts=F("attempts") + 1,
+    )
+    return claimed == 1
+
+
+def run_job(job):
+    """
+    Runs a claimed ``job``, deleting it on success and rescheduling or
+    failing it otherwise. Returns whether it succeeded.
+    """
+    job.refresh_from_db()
+    try:
+        with transaction.atomic():
+            import_string(job.task)(**json.loads(job.kwargs))
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= settings.USERS_JOB_MAX_ATTEMPTS:
+            logger.error(f"Job {job.pk} {job.task} failed for good:\n{error}")
+            job.status = Job.FAILED
+            job.run_after = timezone.now()
+            outcome = "failed"
+        else:
+            delay = settings.USERS_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            logger.warning(f"Job {job.pk} {job.task} failed, retrying in {delay}s")
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+            outcome = "retried"
+        job.last_error = error
+        job.save(update_fields=["status", "run_after", "last_error"])
+        jobs_run.inc(task=job.task, outcome=outcome)
+        return False
+
+    job.delete()
+    jobs_run.inc(task=job.task, outcome="done")
+    return True
+
+
+def run_due_jobs(limit=100):
+    """
+    Claims and runs up to ``limit`` due jobs, returning how many were run.
+    """
+    now = timezone.now()
+    fail_abandoned_jobs(now)
+    run = 0
+    for job in get_due_jobs(now)[:limit]:
+        if claim(job, now):
+            run_job(job)
+            run += 1
+    return run
+
+
+def send_welcome_email(pk):
+    """
+    Greets a new user, queued on signup when ``USERS_WELCOME_EMAIL`` is set.
+    """
+    user = CustomUser.objects.filter(pk=pk, is_active=True).first()
+    if user is None:
+        # deleted or deactivated meanwhile
+        return
+    user.email_user(
+        _("Welcome"),
+        _("Your account %(email)s is ready.") % {"email": user.email},
+    )
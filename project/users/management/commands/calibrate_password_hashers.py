@@ -0,0 +1,111 @@
+import math
+import time
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hashers
+from django.core.management.base import BaseCommand, CommandError
+
+
+def p99(timings):
+    ordered = sorted(timings)
+    return ordered[math.ceil(0.99 * len(ordered)) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the configured PASSWORD_HASHERS on this machine and picks the "
+        "PBKDF2 iteration count whose p99 hashing time fits the target."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target-ms", type=float, default=100.0, help="p99 budget per hash."
+        )
+        parser.add_argument(
+            "--samples", type=int, default=50, help="Hashes timed per measurement."
+        )
+        parser.add_argument(
+            "--min-iterations",
+            type=int,
+            default=PBKDF2PasswordHasher.iterations,
+            help=(
+                "Never suggest fewer PBKDF2 iterations than this, nor than "
+                "Django's default of %(default)s."
+            ),
+        )
+        parser.add_argument(
+            "--output", help="Write the tuned settings to this Python module."
+        )
+
+    def handle(self, *args, **options):
+        self.samples = options["samples"]
+        if self.samples < 1:
+            raise CommandError("--samples must be at least 1.")
+        target = options["target_ms"] / 1000
+        min_iterations = options["min_iterations"]
+        if min_iterations < PBKDF2PasswordHasher.iterations:
+            raise CommandError(
+                f"--min-iterations must be at least Django's default of "
+                f"{PBKDF2PasswordHasher.iterations}."
+            )
+
+        for hasher in get_hashers():
+            try:
+                timing = self.measure(hasher)
+            except ValueError as e:
+                # the hasher's library isn't installed
+                self.stdout.write(f"{hasher.algorithm}: unavailable ({e})")
+                continue
+            self.stdout.write(f"{hasher.algorithm}: p99 {timing * 1000:.1f} ms")
+
+        hasher = get_hashers()[0]
+        if not isinstance(hasher, PBKDF2PasswordHasher):
+            raise CommandError(
+                f"The preferred hasher {hasher.algorithm} has no iteration count to tune."
+            )
+        iterations = self.calibrate(hasher, target, min_iterations)
+
+        snippet = (
+            "# Written by `manage.py calibrate_password_hashers` for a p99 of "
+            f"{options['target_ms']} ms.\n"
+            f"USERS_PBKDF2_ITERATIONS = {iterations}\n"
+        )
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(snippet)
+            self.stdout.write(f"Wrote {options['output']}.")
+        else:
+            self.stdout.write(snippet, ending="")
+
+    def measure(self, hasher, iterations=None):
+        """Returns the p99 time in seconds that ``hasher`` takes per hash."""
+        timings = []
+        for _ in range(self.samples):
+            salt = hasher.salt()
+            start = time.perf_counter()
+            if iterations is None:
+                hasher.encode("calibration password", salt)
+            else:
+                hasher.encode("calibration password", salt, iterations)
+            timings.append(time.perf_counter() - start)
+        return p99(timings)
+
+    def calibrate(self, hasher, target, min_iterations):
+        iterations = hasher.iterations
+        timing = self.measure(hasher, iterations)
+        # hashing time is linear in the iteration count
+        iterations = max(
+            min_iterations, int(iterations * target / timing) // 1000 * 1000
+        )
+        timing = self.measure(hasher, iterations)
+        while timing > target and iterations > min_iterations:
+            iterations = max(min_iterations, int(iterations * 0.9) // 1000 * 1000)
+            timing = self.measure(hasher, iterations)
+
+        self.stdout.write(
+            f"{hasher.algorithm}: {iterations} iterations, p99 {timing * 1000:.1f} ms"
+        )
+        if timing > target:
+            self.stderr.write(
+                f"p99 stays above the target at the minimum of {min_iterations} iterations."
+            )
+        return iterations
@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.jobs import prune_failed_jobs, run_due_jobs
+from users.metrics import registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the jobs queued by users.jobs, such as welcome emails, polling "
+        "for new ones until stopped. Several workers may run side by side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is due instead of waiting for more.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Jobs claimed per poll.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling again when no job is due.",
+        )
+        parser.add_argument(
+            "--prune-failed",
+            type=float,
+            metavar="DAYS",
+            help="Delete jobs that failed more than DAYS days ago whenever none is due.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        prune_after = options["prune_failed"]
+        if prune_after is not None and prune_after < 0:
+            raise CommandError("--prune-failed can't be negative.")
+
+        total = 0
+        try:
+            while True:
+                run = run_due_jobs(batch_size)
+                total += run
+                registry.flush()
+                if run:
+                    continue
+                if prune_after is not None:
+                    pruned = prune_failed_jobs(
+                        timezone.now() - timedelta(days=prune_after)
+                    )
+                    if pruned:
+                        self.stdout.write(f"{pruned} failed jobs deleted")
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"{total} jobs run")
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, IntegerField, OuterRef
+from django.db.models.functions import Cast
+from guardian.models import GroupObjectPermission, UserObjectPermission
+
+from users.catalog import catalog
+from users.models import CustomUser
+
+
+def get_orphans(model):
+    """
+    Returns the rows of ``model`` granting permissions on users that no longer exist.
+    """
+    # cast the outer object_pk rather than the user pk, so the pk index is used
+    user = CustomUser.objects.filter(pk=Cast(OuterRef("object_pk"), IntegerField()))
+    return (
+        model.objects.filter(content_type_id=catalog.content_type_id)
+        .annotate(_user_exists=Exists(user))
+        .filter(_user_exists=False)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes rows of guardian's generic object permission tables granting "
+        "permissions on users that no longer exist. Grants on users are kept in "
+        "tables with a foreign key now, but rows for users deleted before the "
+        "move, or by raw SQL, are left behind in the generic ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows deleted per statement and transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the orphaned rows.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        for model in (UserObjectPermission, GroupObjectPermission):
+            orphans = get_orphans(model)
+            if options["dry_run"]:
+                self.stdout.write(f"{model._meta.label}: {orphans.count()} orphaned")
+                continue
+
+            deleted = 0
+            while True:
+                with transaction.atomic():
+                    pks = list(orphans.values_list("pk", flat=True)[:batch_size])
+                    if not pks:
+                        break
+                    # the grants concern no existing user, so no cache needs bumping
+                    deleted += model.objects.filter(pk__in=pks)._raw_delete(
+                        model.objects.db
+                    )
+            self.stdout.write(f"{model._meta.label}: {deleted} deleted")
@@ -1,9 +1,128 @@
+from threading import local
+
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models, transaction
+
+from .hashers import make_passwords
+
+_state = local()
+
+
+def in_bulk_delete():
+    """
+    Returns whether ``CustomUserQuerySet.delete`` is running in this thread.
+    """
+    return getattr(_state, "bulk_delete", False)
+
+
+class CustomUserQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Deletes the users along with the object permissions granted on them.
+
+        Grants on the users are cleared with one set-based statement per table
+        before the cascade gets to them, and the caches are invalidated once
+        for the whole batch rather than from the signal of every row.
+        """
+        from .authentication import invalidate_cached_users
+        from .conditional import bump_list_version
+        from .models import (
+            CustomUserGroupObjectPermission,
+            CustomUserUserObjectPermission,
+        )
+        from .permission_cache import bump_group_versions, bump_user_versions
+
+        assert self.query.can_filter(), "Cannot use 'limit' or 'offset' with delete."
+
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list("pk", flat=True))
+            users = self.order_by().values("pk")
+            user_perms = CustomUserUserObjectPermission.objects.filter(
+                content_object__in=users
+            )
+            group_perms = CustomUserGroupObjectPermission.objects.filter(
+                content_object__in=users
+            )
+            holders = set(user_perms.values_list("user_id", flat=True))
+            groups = set(group_perms.values_list("group_id", flat=True))
+            # the cascade would load every grant to send its signals, and the
+            # caches are bumped below anyway
+            counts = {
+                user_perms.model._meta.label: user_perms._raw_delete(self.db),
+                group_perms.model._meta.label: group_perms._raw_delete(self.db),
+            }
+
+            _state.bulk_delete = True
+            try:
+                deleted, rows = super().delete()
+            finally:
+                _state.bulk_delete = False
+
+            invalidate_cached_users(*pks)
+            bump_user_versions(*pks, *holders)
+            bump_group_versions(*groups)
+            bump_list_version()
 
+        for label, count in counts.items():
+            if count:
+                rows[label] = rows.get(label, 0) + count
+                deleted += count
+        return deleted, rows
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def update(self, **kwargs):
+        """
+        Updates the users and invalidates their cached copies, which ``save()``
+        would do through ``post_save``. A new ``email`` sets ``email_lower`` too.
+        """
+        from .authentication import invalidate_cached_users
+        from .conditional import bump_list_version
 
-class UserManager(BaseUserManager):
+        if "email" in kwargs and "email_lower" not in kwargs:
+            email = kwargs["email"]
+            if not isinstance(email, str):
+                # SQL's LOWER differs from str.lower() on some databases
+                raise TypeError("update() only takes a str for email.")
+            kwargs["email_lower"] = email.lower()
+
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            invalidate_cached_users(*pks)
+            bump_list_version()
+        return rows
+
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        # the caches are invalidated by update(), which this calls per batch
+        objs = list(objs)
+        fields = list(fields)
+        if "email" in fields and "email_lower" not in fields:
+            for obj in objs:
+                obj.email_lower = obj.email.lower()
+            fields.append("email_lower")
+        super().bulk_update(objs, fields, batch_size=batch_size)
+
+    bulk_update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            # bulk_create doesn't call save()
+            obj.email_lower = obj.email.lower()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class UserManager(BaseUserManager.from_queryset(CustomUserQuerySet)):
     use_in_migrations = True
 
+    def get_by_natural_key(self, username):
+        # case-insensitive, through the unique index on email_lower
+        return self.get(email_lower=username.lower())
+
     def _create_user(self, email, password, **extra_fields):
         """
 		Creates and saves a User with the given email and password.
@@ -31,3 +150,49 @@ class UserManager(BaseUserManager):
             raise ValueError("Superuser must have is_staff=True.")
 
         return self._create_user(email, password, **extra_fields)
+
+    def bulk_create_users(self, users_data, batch_size=None, hash_workers=None):
+        """
+        Creates many users at once from an iterable of dicts holding ``email``,
+        an optional ``password`` and any other model fields.
+
+        ``post_save`` is not sent by ``bulk_create``, so the permissions that
+        ``user_post_save`` would give each user are written here in a fixed
+        number of set-based statements, inside the same transaction.
+
+        Passwords are hashed by ``hash_workers`` processes before the
+        transaction opens; see ``users.hashers.make_passwords``.
+        """
+        from .conditional import bump_list_version
+        from .models import assign_default_perms, enqueue_signup_jobs
+
+        users = []
+        passwords = []
+        for data in users_data:
+            data = dict(data)
+            email = data.pop("email", None)
+            if not email:
+                raise ValueError("The given email must be set")
+            passwords.append(data.pop("password", None))
+            data.setdefault("is_superuser", False)
+            user = self.model(email=self.normalize_email(email), **data)
+            users.append(user)
+
+        emails = [user.email for user in users]
+        if len({email.lower() for email in emails}) != len(emails):
+            raise ValueError("The given emails must be unique")
+
+        for user, password in zip(users, make_passwords(passwords, hash_workers)):
+            user.password = password
+
+        with transaction.atomic(using=self.db):
+            users = self.bulk_create(users, batch_size=batch_size)
+            if users and users[0].pk is None:
+                # Backends that can't return ids from a bulk insert leave pk unset.
+                by_email = self.in_bulk(emails, field_name="email")
+                users = [by_email[email] for email in emails]
+            assign_default_perms(users)
+            enqueue_signup_jobs(users)
+            # bulk_create sends no post_save
+            bump_list_version()
+        return users
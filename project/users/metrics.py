@@ -0,0 +1,412 @@
+"""
+Counters and histograms for the hot paths of authentication and permissions,
+exposed at ``/metrics/`` in the Prometheus text format.
+
+Every process keeps its values in memory and writes them to
+``<USERS_METRICS_DIR>/<pid>-<token>.json`` at most every
+``USERS_METRICS_FLUSH_INTERVAL`` seconds, so the page sums what all workers on
+the host reported. The random token keeps a worker that got a reused pid from
+overwriting the file of an exited one. When the page is rendered, the files
+of exited workers are folded into ``exited.json`` and removed, so counters
+don't go backwards and the directory doesn't grow as workers come and go.
+Values a worker gathered since its last flush are lost when it exits.
+Without ``USERS_METRICS_DIR`` the page shows the serving process only.
+"""
+
+import glob
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import fcntl
+except ImportError:  # Windows, where files of exited workers are kept
+    fcntl = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+EXITED_FILE = "exited.json"
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running as another user
+        return True
+    return True
+
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    # readers never see a partly written file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def locked(directory):
+    """
+    Holds an exclusive lock on ``directory`` while files are folded or read.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, ".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class Registry:
+    """
+    Holds the metrics of this process and their values.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.values = {}
+        self.pid = os.getpid()
+        self.token = uuid.uuid4().hex
+        self.flushed = 0.0
+
+    def get_path(self, directory):
+        return os.path.join(directory, f"{self.pid}-{self.token}.json")
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def update(self, name, key, update):
+        with self.lock:
+            if self.pid != os.getpid():
+                # forked, the values belong to the parent
+                self.reset()
+            samples = self.values.setdefault(name, {})
+            samples[key] = update(samples.get(key))
+
+    def snapshot(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.reset()
+            return {
+                # histogram values are updated in place
+                name: [
+                    [list(key), list(value) if isinstance(value, list) else value]
+                    for key, value in samples.items()
+                ]
+                for name, samples in self.values.items()
+            }
+
+    def flush(self, force=False):
+        """
+        Writes this process's values to ``USERS_METRICS_DIR``, unless they were
+        written less than ``USERS_METRICS_FLUSH_INTERVAL`` seconds ago.
+        """
+        directory = settings.USERS_METRICS_DIR
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.USERS_METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        os.makedirs(directory, exist_ok=True)
+        # taken first, as it resets a forked process and with it the path
+        snapshot = self.snapshot()
+        write_json(self.get_path(directory), snapshot)
+
+    def fold_exited(self, directory):
+        """
+        Adds the files of exited workers to ``exited.json`` and removes them.
+        """
+        exited_path = os.path.join(directory, EXITED_FILE)
+        exited = read_json(exited_path) or {"folded": [], "values": {}}
+        names = []
+        for path in glob.glob(os.path.join(directory, "*-*.json")):
+            pid = os.path.basename(path).split("-", 1)[0]
+            if pid.isdigit() and not process_exists(int(pid)):
+                names.append(os.path.basename(path))
+        if not names:
+            return
+
+        # files listed were folded by a reader that stopped before removing them
+        new = [name for name in names if name not in exited["folded"]]
+        snapshots = [exited["values"]]
+        snapshots.extend(read_json(os.path.join(directory, name)) or {} for name in new)
+        values = self.dump(self.merge(snapshots))
+        write_json(exited_path, {"folded": names, "values": values})
+        for name in names:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+    def collect(self):
+        """
+        Returns the values of all processes, summed per metric and labels.
+        """
+        directory = settings.USERS_METRICS_DIR
+        if not directory:
+            return self.merge([self.snapshot()])
+
+        self.flush(force=True)
+        with locked(directory):
+            if fcntl is not None:
+                self.fold_exited(directory)
+            snapshots = [
+                read_json(path) or {}
+                for path in glob.glob(os.path.join(directory, "*-*.json"))
+            ]
+            exited = read_json(os.path.join(directory, EXITED_FILE))
+        if exited is not None:
+            snapshots.append(exited["values"])
+        return self.merge(snapshots)
+
+    def merge(self, snapshots):
+        """
+        Returns the values of ``snapshots`` summed per metric and labels.
+        """
+        merged = {}
+        for snapshot in snapshots:
+            for name, samples in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                target = merged.setdefault(name, {})
+                for key, value in samples:
+                    key = tuple(key)
+                    target[key] = metric.merge(target.get(key), value)
+        return merged
+
+    def dump(self, merged):
+        """
+        Returns ``merged`` values in the form of a snapshot.
+        """
+        return {
+            name: [[list(key), value] for key, value in samples.items()]
+            for name, samples in merged.items()
+        }
+
+    def render(self):
+        """
+        Returns the values of all processes in the Prometheus text format.
+        """
+        values = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(values.get(name, {}).items()):
+                lines.extend(metric.render(key, value))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ""
+    labels = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\""),
+        )
+        for name, value in pairs
+    )
+    return "{" + labels + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        registry.update(
+            self.name, self.key(labels), lambda value: (value or 0) + amount
+        )
+
+    def merge(self, value, other):
+        return (value or 0) + other
+
+    def render(self, key, value):
+        labels = format_labels(zip(self.labelnames, key))
+        return [f"{self.name}{labels} {format_value(value)}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    # seconds
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, amount, **labels):
+        index = next(i for i, bound in enumerate(self.buckets) if amount <= bound)
+
+        def update(value):
+            # counts per bucket, not cumulative, then the sum
+            value = value or [0] * len(self.buckets) + [0]
+            value[index] += 1
+            value[-1] += amount
+            return value
+
+        registry.update(self.name, self.key(labels), update)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def merge(self, value, other):
+        if value is None:
+            return list(other)
+        return [a + b for a, b in zip(value, other)]
+
+    def render(self, key, value):
+        pairs = list(zip(self.labelnames, key))
+        lines = []
+        count = 0
+        for bound, observed in zip(self.buckets, value):
+            count += observed
+            labels = format_labels(pairs + [("le", format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {format_value(count)}")
+        labels = format_labels(pairs)
+        lines.append(f"{self.name}_sum{labels} {format_value(value[-1])}")
+        lines.append(f"{self.name}_count{labels} {format_value(count)}")
+        return lines
+
+
+permission_checks = Counter(
+    "users_permission_checks_total",
+    "Decisions of CustomObjectPermissions, by check and outcome.",
+    ["check", "decision"],
+)
+permission_cache_lookups = Counter(
+    "users_permission_cache_lookups_total",
+    "Object permission lookups in the permission cache, by result.",
+    ["result"],
+)
+user_post_save_seconds = Histogram(
+    "users_user_post_save_seconds",
+    "Time spent in the user_post_save receiver.",
+    ["created"],
+)
+password_hash_seconds = Histogram(
+    "users_password_hash_seconds", "Time spent hashing a password in set_password."
+)
+jobs_run = Counter(
+    "users_jobs_total",
+    "Jobs run by run_jobs, by task and outcome.",
+    ["task", "outcome"],
+)
+request_seconds = Histogram(
+    "users_request_seconds", "Request latency, by view.", ["view", "method"]
+)
+request_queries = Histogram(
+    "users_request_queries",
+    "SQL statements per request, by view.",
+    ["view", "method"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting statements.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency and the number of SQL statements of every request by
+    view name, and writes the values out for the other processes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            start = time.perf_counter()
+            response = self.get_response(request)
+            elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        # unresolved paths share one label, so scanners cannot grow the series
+        view = match.view_name if match is not None else "<unresolved>"
+        request_seconds.observe(elapsed, view=view, method=request.method)
+        request_queries.observe(counter.count, view=view, method=request.method)
+        registry.flush()
+        return response
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = "text/plain"
+    format = "txt"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        # errors, such as the 403 for non-staff users
+        return json.dumps(data).encode(self.charset)
@@ -0,0 +1,24 @@
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from .authentication import get_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    ``AuthenticationMiddleware`` resolving the user with ``get_user`` from
+    ``users.authentication``. DRF's ``SessionAuthentication`` reads it too.
+    """
+
+    def process_request(self, request):
+        assert hasattr(request, "session"), (
+            "The authentication middleware requires session middleware to be "
+            "installed before it."
+        )
+        request.user = SimpleLazyObject(lambda: self.get_user(request))
+
+    @staticmethod
+    def get_user(request):
+        if not hasattr(request, "_cached_user"):
+            request._cached_user = get_user(request)
+        return request._cached_user
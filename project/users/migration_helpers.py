@@ -0,0 +1,42 @@
+"""
+Helpers for data migrations that have to run on large tables.
+
+Rows are processed in bounded batches walked by pk, each batch committed on its
+own, so memory and lock times stay flat and an interrupted migration loses at
+most one batch. Migrations using them set ``atomic = False``.
+"""
+
+import logging
+
+from django.db import transaction
+
+logger = logging.getLogger("django")
+
+BATCH_SIZE = 1000
+
+
+def run_in_batches(queryset, process, batch_size=BATCH_SIZE, label=None):
+    """
+    Calls ``process`` with the rows of ``queryset`` in pk order, ``batch_size``
+    at a time, each call in its own transaction. Returns the number of rows seen.
+
+    To resume after an interruption, ``queryset`` should only match rows that
+    still need work, so that a rerun skips the batches already committed.
+    """
+    label = label or queryset.model._meta.label
+    using = queryset.db
+    last_pk = None
+    done = 0
+    while True:
+        batch = queryset.order_by("pk")
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        with transaction.atomic(using=using):
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            process(batch)
+        last_pk = batch[-1].pk
+        done += len(batch)
+        logger.info(f"{label}: {done} rows processed")
+    return done
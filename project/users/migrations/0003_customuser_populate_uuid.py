@@ -1,16 +1,35 @@
 import uuid
 
 from django.db import migrations
+from django.db.models import Count, Q
+
+from users.migration_helpers import run_in_batches
 
 
 def gen_uuid(apps, schema_editor):
     CustomUser = apps.get_model("users", "CustomUser")
-    for row in CustomUser.objects.all():
-        row.uuid = uuid.uuid4()
-        row.save(update_fields=["uuid"])
+    users = CustomUser.objects.using(schema_editor.connection.alias)
+    # 0002 gave every existing row the same default, and rows already given
+    # their own uuid by an interrupted run are skipped
+    duplicated = list(
+        users.values("uuid")
+        .annotate(count=Count("pk"))
+        .filter(count__gt=1)
+        .values_list("uuid", flat=True)
+    )
+    pending = users.filter(Q(uuid__isnull=True) | Q(uuid__in=duplicated))
+
+    def regenerate(batch):
+        for row in batch:
+            row.uuid = uuid.uuid4()
+        users.bulk_update(batch, ["uuid"])
+
+    run_in_batches(pending.only("pk", "uuid"), regenerate, label="users.uuid")
 
 
 class Migration(migrations.Migration):
+    # every batch commits on its own
+    atomic = False
 
     dependencies = [("users", "0002_customuser_uuid")]
 
@@ -1,24 +1,36 @@
 # Generated by Django 2.2.6 on 2019-11-02 20:34
 from django.db import migrations
 
+from users.migration_helpers import run_in_batches
+
 
 def apply_add_admin_group(apps, schema_editor):
+    using = schema_editor.connection.alias
     Group = apps.get_model("auth", "Group")
-    admins_group = Group.objects.create(name=u"admins")
+    admins_group, _ = Group.objects.using(using).get_or_create(name="admins")
 
     CustomUser = apps.get_model("users", "CustomUser")
-    staff = CustomUser.objects.filter(is_staff=True)
-    admins_group.user_set.add(*staff)
+    Membership = CustomUser.groups.through
+
+    def add_to_admins(batch):
+        Membership.objects.using(using).bulk_create(
+            [Membership(customuser_id=user.pk, group=admins_group) for user in batch],
+            ignore_conflicts=True,
+        )
+
+    staff = CustomUser.objects.using(using).filter(is_staff=True).only("pk")
+    run_in_batches(staff, add_to_admins, label="users.admins")
 
 
 def revert_add_admin_group(apps, schema_editor):
     Group = apps.get_model("auth", "Group")
-    admins_group = Group.objects.filter(name__in=[u"admins"])
-    admins_group.user_set.clear()
-    admins_group.delete()
+    # memberships go with the group
+    Group.objects.using(schema_editor.connection.alias).filter(name="admins").delete()
 
 
 class Migration(migrations.Migration):
+    # every batch commits on its own
+    atomic = False
 
     dependencies = [
         ("auth", "0011_update_proxy_permissions"),
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+# Object permissions now implied by users.backends.ImplicitObjectPermissionBackend
+SELF_CODENAMES = ("change_customuser", "delete_customuser", "view_customuser")
+ADMINS_GROUP_CODENAMES = ("add_customuser",) + SELF_CODENAMES
+
+
+def get_user_content_type(apps):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    return ContentType.objects.filter(app_label="users", model="customuser").first()
+
+
+def remove_implicit_object_permissions(apps, schema_editor):
+    content_type = get_user_content_type(apps)
+    if content_type is None:
+        # fresh database, permissions haven't been created yet
+        return
+
+    UserObjectPermission = apps.get_model("guardian", "UserObjectPermission")
+    GroupObjectPermission = apps.get_model("guardian", "GroupObjectPermission")
+
+    UserObjectPermission.objects.filter(
+        content_type=content_type,
+        permission__codename__in=SELF_CODENAMES,
+        object_pk=Cast("user_id", CharField()),
+    ).delete()
+    GroupObjectPermission.objects.filter(
+        content_type=content_type,
+        group__name="admins",
+        permission__codename__in=ADMINS_GROUP_CODENAMES,
+    ).delete()
+
+
+def restore_implicit_object_permissions(apps, schema_editor):
+    content_type = get_user_content_type(apps)
+    if content_type is None:
+        return
+
+    Group = apps.get_model("auth", "Group")
+    Permission = apps.get_model("auth", "Permission")
+    CustomUser = apps.get_model("users", "CustomUser")
+    UserObjectPermission = apps.get_model("guardian", "UserObjectPermission")
+    GroupObjectPermission = apps.get_model("guardian", "GroupObjectPermission")
+
+    perms = {
+        perm.codename: perm
+        for perm in Permission.objects.filter(
+            content_type=content_type, codename__in=ADMINS_GROUP_CODENAMES
+        )
+    }
+    admins_group = Group.objects.get(name="admins")
+    user_pks = list(
+        CustomUser.objects.exclude(email=settings.ANONYMOUS_USER_NAME).values_list(
+            "pk", flat=True
+        )
+    )
+
+    UserObjectPermission.objects.bulk_create(
+        [
+            UserObjectPermission(
+                user_id=pk,
+                permission=perms[codename],
+                content_type=content_type,
+                object_pk=str(pk),
+            )
+            for pk in user_pks
+            for codename in SELF_CODENAMES
+        ],
+        ignore_conflicts=True,
+    )
+    GroupObjectPermission.objects.bulk_create(
+        [
+            GroupObjectPermission(
+                group=admins_group,
+                permission=perms[codename],
+                content_type=content_type,
+                object_pk=str(pk),
+            )
+            for pk in user_pks
+            for codename in ADMINS_GROUP_CODENAMES
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("guardian", "0002_generic_permissions_index"),
+        ("users", "0005_make_admins_group"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_implicit_object_permissions, restore_implicit_object_permissions
+        )
+    ]
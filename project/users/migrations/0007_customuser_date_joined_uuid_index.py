@@ -0,0 +1,19 @@
+# Generated by Django 2.2.7 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_remove_implicit_object_permissions"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                fields=["date_joined", "uuid"], name="users_date_joined_uuid_idx"
+            ),
+        ),
+    ]
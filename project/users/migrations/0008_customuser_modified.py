@@ -0,0 +1,20 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("users", "0007_customuser_date_joined_uuid_index")]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="modified",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="last modified",
+            ),
+            preserve_default=False,
+        )
+    ]
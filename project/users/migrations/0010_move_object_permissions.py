@@ -0,0 +1,102 @@
+from django.db import migrations
+
+from users.migration_helpers import run_in_batches
+
+TABLES = (
+    ("UserObjectPermission", "CustomUserUserObjectPermission", "user_id"),
+    ("GroupObjectPermission", "CustomUserGroupObjectPermission", "group_id"),
+)
+
+
+def get_user_content_type(apps):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    return ContentType.objects.filter(app_label="users", model="customuser").first()
+
+
+def move_rows(source, target, make_rows):
+    """
+    Copies ``source`` rows into ``target`` and deletes them, so a rerun after
+    an interruption only sees the rows left to move. ``make_rows`` maps a batch
+    to ``{source pk: target row}``; rows it leaves out stay in place.
+    """
+
+    def move(batch):
+        rows = make_rows(batch)
+        target.objects.using(source.db).bulk_create(
+            rows.values(), ignore_conflicts=True
+        )
+        source.filter(pk__in=rows).delete()
+
+    run_in_batches(source, move, label=target._meta.label)
+
+
+def to_direct_permissions(apps, schema_editor):
+    content_type = get_user_content_type(apps)
+    if content_type is None:
+        # fresh database, nothing was granted yet
+        return
+
+    using = schema_editor.connection.alias
+    CustomUser = apps.get_model("users", "CustomUser")
+
+    for generic, direct, owner in TABLES:
+        Direct = apps.get_model("users", direct)
+
+        def make_rows(batch):
+            object_pks = {row.object_pk for row in batch if row.object_pk.isdigit()}
+            existing = {
+                str(pk)
+                for pk in CustomUser.objects.using(using)
+                .filter(pk__in=object_pks)
+                .values_list("pk", flat=True)
+            }
+            # grants on deleted users are left for sweep_orphaned_permissions
+            return {
+                row.pk: Direct(
+                    content_object_id=int(row.object_pk),
+                    permission_id=row.permission_id,
+                    **{owner: getattr(row, owner)},
+                )
+                for row in batch
+                if row.object_pk in existing
+            }
+
+        source = apps.get_model("guardian", generic).objects.using(using)
+        move_rows(source.filter(content_type=content_type), Direct, make_rows)
+
+
+def to_generic_permissions(apps, schema_editor):
+    content_type = get_user_content_type(apps)
+    if content_type is None:
+        return
+
+    using = schema_editor.connection.alias
+    for generic, direct, owner in TABLES:
+        Generic = apps.get_model("guardian", generic)
+
+        def make_rows(batch):
+            return {
+                row.pk: Generic(
+                    content_type=content_type,
+                    object_pk=str(row.content_object_id),
+                    permission_id=row.permission_id,
+                    **{owner: getattr(row, owner)},
+                )
+                for row in batch
+            }
+
+        source = apps.get_model("users", direct).objects.using(using)
+        move_rows(source.all(), Generic, make_rows)
+
+
+class Migration(migrations.Migration):
+    # every batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("guardian", "0002_generic_permissions_index"),
+        ("users", "0009_customuser_object_permissions"),
+    ]
+
+    operations = [migrations.RunPython(to_direct_permissions, to_generic_permissions)]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("users", "0010_move_object_permissions")]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="email_lower",
+            field=models.EmailField(
+                editable=False,
+                max_length=254,
+                null=True,
+                verbose_name="lowercased email address",
+            ),
+        )
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+from users.migration_helpers import run_in_batches
+
+
+def populate_email_lower(apps, schema_editor):
+    CustomUser = apps.get_model("users", "CustomUser")
+    users = CustomUser.objects.using(schema_editor.connection.alias)
+
+    # 0013 makes the column unique, so stop before filling anything. Emails are
+    # lowered the way the fill does, as SQL's LOWER skips non-ASCII letters on
+    # SQLite.
+    seen = set()
+    clashes = set()
+    for email in users.values_list("email", flat=True).iterator():
+        lowered = email.lower()
+        if lowered in seen:
+            clashes.add(lowered)
+        seen.add(lowered)
+    if clashes:
+        raise RuntimeError(
+            "These emails are used by several users in different cases, merge "
+            f"or rename them before migrating: {', '.join(sorted(clashes))}"
+        )
+
+    def populate(batch):
+        for row in batch:
+            row.email_lower = row.email.lower()
+        users.bulk_update(batch, ["email_lower"])
+
+    # rows filled by an interrupted run are skipped
+    pending = users.filter(email_lower__isnull=True).only("pk", "email")
+    run_in_batches(pending, populate, label="users.email_lower")
+
+
+class Migration(migrations.Migration):
+    # every batch commits on its own
+    atomic = False
+
+    dependencies = [("users", "0011_customuser_email_lower")]
+
+    operations = [migrations.RunPython(populate_email_lower, migrations.RunPython.noop)]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("users", "0012_customuser_populate_email_lower")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="customuser",
+            name="email_lower",
+            field=models.EmailField(
+                editable=False,
+                max_length=254,
+                unique=True,
+                verbose_name="lowercased email address",
+            ),
+        )
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0014_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RevokedToken",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "jti",
+                    models.CharField(
+                        max_length=32, unique=True, verbose_name="token id"
+                    ),
+                ),
+                (
+                    "expires",
+                    models.DateTimeField(db_index=True, verbose_name="expires"),
+                ),
+            ],
+            options={
+                "verbose_name": "revoked token",
+                "verbose_name_plural": "revoked tokens",
+            },
+        ),
+    ]
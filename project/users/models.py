@@ -1,28 +1,35 @@
 from __future__ import unicode_literals
 
+import json
 import logging
 import uuid
 
 from django.conf import settings
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import PermissionsMixin
-from django.contrib.contenttypes.models import ContentType
 from django.core.mail import send_mail
 from django.db import models
-from django.db.models import Q
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from guardian.mixins import GuardianUserMixin
-from guardian.models import UserObjectPermission, GroupObjectPermission
-from guardian.shortcuts import assign_perm, get_perms
+from guardian.models import GroupObjectPermissionBase, UserObjectPermissionBase
 from django.contrib.auth.models import Group
 
-from .managers import UserManager
+from .authentication import invalidate_cached_users
+from .catalog import catalog
+from .conditional import bump_list_version
+from .managers import UserManager, in_bulk_delete
+from .metrics import password_hash_seconds, user_post_save_seconds
+from .permission_cache import bump_group_versions, bump_user_versions
 
 logger = logging.getLogger("django")
 
+# Permissions every user holds on themselves, and those the admins group holds on every user.
+SELF_CODENAMES = ("change_customuser", "delete_customuser", "view_customuser")
+ADMINS_GROUP_CODENAMES = ("add_customuser",) + SELF_CODENAMES
+
 
 def get_anonymous_user_instance(User):
     return User(email=settings.ANONYMOUS_USER_NAME)
@@ -40,6 +47,10 @@ class CustomUser(AbstractBaseUser, PermissionsMixin, GuardianUserMixin):
         _("indentifier"), unique=True, blank=False, default=uuid.uuid4
     )
     email = models.EmailField(_("email address"), unique=True)
+    # kept by save() and bulk_create(), every email lookup goes through it
+    email_lower = models.EmailField(
+        _("lowercased email address"), unique=True, editable=False
+    )
     first_name = models.CharField(_("first name"), max_length=30, blank=True)
     last_name = models.CharField(_("last name"), max_length=150, blank=True)
     is_staff = models.BooleanField(
@@ -56,6 +67,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin, GuardianUserMixin):
         ),
     )
     date_joined = models.DateTimeField(_("date joined"), default=timezone.now)
+    modified = models.DateTimeField(_("last modified"), auto_now=True)
 
     objects = UserManager()
 
@@ -66,11 +78,28 @@ class CustomUser(AbstractBaseUser, PermissionsMixin, GuardianUserMixin):
     class Meta:
         verbose_name = _("user")
         verbose_name_plural = _("users")
+        indexes = [
+            # keyset pagination of the user list
+            models.Index(
+                fields=["date_joined", "uuid"], name="users_date_joined_uuid_idx"
+            )
+        ]
 
     def clean(self):
         super().clean()
         self.email = self.__class__.objects.normalize_email(self.email)
 
+    def save(self, *args, **kwargs):
+        self.email_lower = self.email.lower()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "email" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "email_lower"}
+        super().save(*args, **kwargs)
+
+    def set_password(self, raw_password):
+        with password_hash_seconds.time():
+            super().set_password(raw_password)
+
     def get_full_name(self):
         """
         Return the first_name plus the last_name, with a space in between.
@@ -87,14 +116,215 @@ class CustomUser(AbstractBaseUser, PermissionsMixin, GuardianUserMixin):
         send_mail(subject, message, from_email, [self.email], **kwargs)
 
 
-# when a CustomUser is deleted, remove the object permissions for that user object.
-@receiver(pre_delete, sender=CustomUser)
-def remove_obj_perms_connected_with_user(sender, instance, **kwargs):
-    filters = Q(
-        content_type=ContentType.objects.get_for_model(instance), object_pk=instance.pk
+# Object permissions on users reference them with a foreign key, so grants are
+# joined on integer pks and go away with the user they are on. guardian picks
+# these models over its generic ones for CustomUser instances.
+class CustomUserUserObjectPermission(UserObjectPermissionBase):
+    content_object = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="user_grants"
+    )
+
+
+class CustomUserGroupObjectPermission(GroupObjectPermissionBase):
+    content_object = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="group_grants"
+    )
+
+
+class Job(models.Model):
+    """
+    A call of the function at the dotted path ``task`` with the JSON encoded
+    ``kwargs``, left for ``manage.py run_jobs``; see ``users.jobs``.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, _("pending")),
+        (RUNNING, _("running")),
+        (FAILED, _("failed")),
+    )
+
+    task = models.CharField(_("task"), max_length=200)
+    kwargs = models.TextField(_("keyword arguments"), default="{}")
+    status = models.CharField(
+        _("status"), max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(_("attempts"), default=0)
+    # when a pending job is due, when a running one is given up on, or when a
+    # failed one failed
+    run_after = models.DateTimeField(_("run after"), default=timezone.now)
+    last_error = models.TextField(_("last error"), blank=True)
+    created = models.DateTimeField(_("created"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("job")
+        verbose_name_plural = _("jobs")
+        indexes = [
+            # the worker's poll for due jobs
+            models.Index(
+                fields=["status", "run_after"], name="users_job_status_run_after_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
+
+class RevokedToken(models.Model):
+    """
+    The id of an access token revoked before it expired; see ``users.tokens``.
+    """
+
+    jti = models.CharField(_("token id"), max_length=32, unique=True)
+    # once the token expired on its own, the row can go
+    expires = models.DateTimeField(_("expires"), db_index=True)
+
+    class Meta:
+        verbose_name = _("revoked token")
+        verbose_name_plural = _("revoked tokens")
+
+    def __str__(self):
+        return self.jti
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def user_changed(sender, instance, signal, **kwargs):
+    if in_bulk_delete():
+        # CustomUserQuerySet.delete bumps once for the whole batch
+        return
+    invalidate_cached_users(instance.pk)
+    if signal is post_delete:
+        # drop anything still cached under the pk
+        bump_user_versions(instance.pk)
+    bump_list_version()
+
+
+# keep the permission cache and the list version in step with grants and group memberships
+@receiver([post_save, post_delete], sender=CustomUserUserObjectPermission)
+def user_obj_perms_changed(sender, instance, **kwargs):
+    bump_user_versions(instance.user_id)
+    bump_list_version()
+
+
+@receiver([post_save, post_delete], sender=CustomUserGroupObjectPermission)
+def group_obj_perms_changed(sender, instance, **kwargs):
+    bump_group_versions(instance.group_id)
+    bump_list_version()
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith("post_"):
+        bump_list_version()
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            bump_user_versions(instance.pk)
+    elif action in ("post_add", "post_remove"):
+        bump_user_versions(*pk_set)
+    elif action == "pre_clear":
+        bump_user_versions(*instance.user_set.values_list("pk", flat=True))
+
+
+# model permissions are part of what users.anonymous and cached session users
+# keep, so either side of a change replaces the versions they are kept under
+@receiver(m2m_changed, sender=CustomUser.user_permissions.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            invalidate_cached_users(instance.pk)
+    elif action in ("post_add", "post_remove"):
+        invalidate_cached_users(*pk_set)
+    elif action == "pre_clear":
+        invalidate_cached_users(*instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            bump_group_versions(instance.pk)
+    elif action in ("post_add", "post_remove"):
+        bump_group_versions(*pk_set)
+    elif action == "pre_clear":
+        bump_group_versions(*instance.group_set.values_list("pk", flat=True))
+
+
+def assign_admins_group_perms(using=None):
+    """
+    Make sure the admins group holds the model permissions on users. Runs
+    after every migration rather than with each signup.
+    """
+    try:
+        admins_group_id = catalog.admins_group_id
+    except Group.DoesNotExist:
+        return
+    GroupPermission = Group.permissions.through
+    GroupPermission.objects.using(using).bulk_create(
+        [
+            GroupPermission(group_id=admins_group_id, permission_id=permission_id)
+            for permission_id in catalog.permission_ids(ADMINS_GROUP_CODENAMES)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def assign_default_perms(users):
+    """
+    Give newly created users their model permissions and add staff to the
+    admins group, which is all a user needs to act on themselves right away.
+
+    Object permissions of users on themselves and of the admins group on every
+    user are implied by ``users.backends.ImplicitObjectPermissionBackend`` and
+    not stored. Every step is a set-based statement, so the number of queries
+    does not grow with the number of users. Callers provide the transaction.
+    """
+    users = [user for user in users if user.email != settings.ANONYMOUS_USER_NAME]
+    if not users:
+        return
+
+    UserPermission = CustomUser.user_permissions.through
+    Membership = CustomUser.groups.through
+
+    # Assign model permissions
+    UserPermission.objects.bulk_create(
+        [
+            UserPermission(customuser_id=user.pk, permission_id=permission_id)
+            for user in users
+            for permission_id in catalog.permission_ids(SELF_CODENAMES)
+        ],
+        ignore_conflicts=True,
+    )
+
+    staff = [user.pk for user in users if user.is_staff]
+    if staff:
+        admins_group_id = catalog.admins_group_id
+        Membership.objects.bulk_create(
+            [Membership(customuser_id=pk, group_id=admins_group_id) for pk in staff],
+            ignore_conflicts=True,
+        )
+        # bulk_create sends no m2m_changed
+        bump_user_versions(*staff)
+
+
+def enqueue_signup_jobs(users):
+    """
+    Queue the work on newly created users that can wait for ``run_jobs``. The
+    jobs are written in the caller's transaction, so they exist exactly when
+    the users do.
+    """
+    users = [user for user in users if user.email != settings.ANONYMOUS_USER_NAME]
+    if not users or not settings.USERS_WELCOME_EMAIL:
+        return
+    Job.objects.bulk_create(
+        [
+            Job(
+                task="users.jobs.send_welcome_email", kwargs=json.dumps({"pk": user.pk})
+            )
+            for user in users
+        ]
     )
-    UserObjectPermission.objects.filter(filters).delete()
-    GroupObjectPermission.objects.filter(filters).delete()
 
 
 @receiver(post_save, sender=CustomUser)
@@ -103,32 +333,10 @@ def user_post_save(sender, **kwargs):
     Make sure users have the permission to add, change, and delete themselves.
     """
     user, created = kwargs["instance"], kwargs["created"]
-    if created and user.email != settings.ANONYMOUS_USER_NAME:
-        logger.debug(
-            f"Giving {created} change, delete, and view permissions for {user}."
-        )
-        # Assign model permissions
-        assign_perm("users.change_customuser", user)
-        assign_perm("users.delete_customuser", user)
-        assign_perm("users.view_customuser", user)
-
-        # Assign object permissions on self
-        assign_perm("users.change_customuser", user, user)
-        assign_perm("users.delete_customuser", user, user)
-        assign_perm("users.view_customuser", user, user)
-
-        # Assign object permissions to admins
-        admins_group = Group.objects.get(name="admins")
-        if not "users.add_customuser" in get_perms(admins_group, user):
-            assign_perm("users.add_customuser", admins_group, user)
-            assign_perm("users.change_customuser", admins_group, user)
-            assign_perm("users.delete_customuser", admins_group, user)
-            assign_perm("users.view_customuser", admins_group, user)
-            # assign model permissions to admins, just in case
-            assign_perm("users.add_customuser", admins_group)
-            assign_perm("users.change_customuser", admins_group)
-            assign_perm("users.delete_customuser", admins_group)
-            assign_perm("users.view_customuser", admins_group)
-
-        if user.is_staff:
-            admins_group.user_set.add(user)
+    with user_post_save_seconds.time(created=created):
+        if created and user.email != settings.ANONYMOUS_USER_NAME:
+            logger.debug(
+                f"Giving {created} change, delete, and view permissions for {user}."
+            )
+            assign_default_perms([user])
+            enqueue_signup_jobs([user])
@@ -0,0 +1,55 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class CustomUserCursorPagination(CursorPagination):
+    """
+    Keyset pagination walking the (date_joined, uuid) index newest first, so
+    deep pages cost the same as the first one. Clients may ask for smaller or
+    larger pages with ``?limit=``, up to ``max_page_size``.
+    """
+
+    ordering = ("-date_joined", "-uuid")
+    page_size = 100
+    page_size_query_param = "limit"
+    max_page_size = 1000
+
+
+def estimate_rows(queryset):
+    """
+    Returns the planner's estimate of the rows in the table of ``queryset``
+    on PostgreSQL, or ``None`` where there is none.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # -1 for tables that were never analyzed
+    return int(row[0]) if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists that never counts past ``count_limit``
+    rows. An unfiltered queryset takes the planner's estimate when it is
+    larger; anything else is counted up to the limit, so only the first
+    ``count_limit`` results of a broad search get page links.
+    """
+
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset)
+            if estimate is not None and estimate > self.count_limit:
+                return estimate
+        return queryset.order_by()[: self.count_limit].count()
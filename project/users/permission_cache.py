@@ -0,0 +1,136 @@
+"""
+Cross-request cache of the object permissions resolved for each user.
+
+Entries are keyed by a version token per user and per group. Signal receivers
+in ``users.models`` replace those tokens whenever grants or group memberships
+change, which orphans every entry computed from the old state. The cache is
+bypassed inside transactions, so uncommitted grants never reach it, and
+nothing read from the replica is stored, as it may predate the tokens. Only
+workers sharing the cache see replaced tokens, hence ``users.E002``.
+"""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .metrics import permission_cache_lookups
+from .routers import is_reading_from_replica
+
+stats = {"hits": 0, "misses": 0}
+
+
+def get_cache():
+    return caches[settings.USERS_PERMISSION_CACHE]
+
+
+def is_enabled():
+    return not connection.in_atomic_block
+
+
+def can_store():
+    """
+    Returns whether what was just read may be cached.
+    """
+    return is_enabled() and not is_reading_from_replica()
+
+
+def get_stats():
+    """Returns the hit and miss counters of this process."""
+    return dict(stats)
+
+
+def reset_stats():
+    stats.update(hits=0, misses=0)
+
+
+def _version_key(kind, pk):
+    return f"users:perms:version:{kind}:{pk}"
+
+
+def _new_version():
+    # random rather than incremented, so an evicted version is never reused
+    return uuid.uuid4().hex
+
+
+def _get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _bump(keys):
+    get_cache().set_many({key: _new_version() for key in keys})
+
+
+def bump_versions(kind, pks):
+    keys = [_version_key(kind, pk) for pk in pks]
+    if not keys:
+        return
+    _bump(keys)
+    if connection.in_atomic_block:
+        # entries computed while the change was uncommitted are stale too
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def bump_user_versions(*pks):
+    bump_versions("user", pks)
+
+
+def bump_group_versions(*pks):
+    bump_versions("group", pks)
+
+
+def get_signature(user):
+    """
+    Returns a digest of the versions the permissions of ``user`` depend on.
+    """
+    cache = get_cache()
+    (user_version,) = _get_versions([_version_key("user", user.pk)])
+    groups_key = f"users:perms:groups:{user.pk}:{user_version}"
+    group_pks = cache.get(groups_key)
+    if group_pks is None:
+        group_pks = sorted(user.groups.values_list("pk", flat=True))
+        if can_store():
+            cache.set(groups_key, group_pks)
+    group_versions = _get_versions([_version_key("group", pk) for pk in group_pks])
+    versions = ":".join([user_version] + group_versions)
+    return hashlib.md5(versions.encode()).hexdigest()
+
+
+def _perms_key(user, signature, ctype_id, pk):
+    return f"users:perms:obj:{user.pk}:{signature}:{ctype_id}:{pk}"
+
+
+def get_perms(user, signature, ctype_id, pks):
+    """
+    Returns a dict of the cached codenames of ``user`` on the ``pks`` found in the cache.
+    """
+    keys = {_perms_key(user, signature, ctype_id, pk): pk for pk in pks}
+    found = get_cache().get_many(keys)
+    stats["hits"] += len(found)
+    stats["misses"] += len(keys) - len(found)
+    permission_cache_lookups.inc(len(found), result="hit")
+    permission_cache_lookups.inc(len(keys) - len(found), result="miss")
+    return {keys[key]: perms for key, perms in found.items()}
+
+
+def set_perms(user, signature, ctype_id, perms):
+    """
+    Stores ``perms``, a dict of codename lists by object pk, unless they were
+    read from the replica.
+    """
+    if not can_store():
+        return
+    get_cache().set_many(
+        {
+            _perms_key(user, signature, ctype_id, pk): codenames
+            for pk, codenames in perms.items()
+        }
+    )
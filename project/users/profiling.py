@@ -0,0 +1,158 @@
+"""
+Profiles single requests on demand, for finding where a slow one spends its time.
+
+A request is profiled when it carries an ``X-Profile`` header signed by
+``make_profile_token``, or the ``profile`` query parameter from a staff user.
+It then runs under cProfile while every SQL statement is recorded with its
+duration and the line of project code that issued it. The report is written to
+``USERS_PROFILE_DIR``; parameters of statements are left out, so no secrets end
+up on disk. Other requests only pay for two dictionary lookups.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import traceback
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+
+from users import metrics
+
+SALT = "users.profiling"
+# modules whose execute wrappers sit between the caller and the database
+WRAPPER_FILES = (__file__, metrics.__file__)
+HEADER = "HTTP_X_PROFILE"
+QUERY_PARAM = "profile"
+
+
+def make_profile_token():
+    """
+    Returns a value for the ``X-Profile`` header, valid for ``USERS_PROFILE_TOKEN_MAX_AGE``.
+    """
+    return signing.dumps("profile", salt=SALT)
+
+
+def get_call_site():
+    """
+    Returns the innermost frame of project code outside this module, as ``path:line in function``.
+    """
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        filename = frame.filename
+        if (
+            filename.startswith(settings.BASE_DIR)
+            and "site-packages" not in filename
+            and filename not in WRAPPER_FILES
+        ):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            return f"{path}:{frame.lineno} in {frame.name}"
+    return None
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper recording each statement with its duration and call site.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                {
+                    "alias": self.alias,
+                    "sql": sql,
+                    "seconds": time.perf_counter() - start,
+                    "call_site": get_call_site(),
+                }
+            )
+
+
+class ProfilingMiddleware:
+    """
+    Runs the requests asking for it under cProfile, see the module docstring.
+    Install it last, so the user is known and the whole view is covered.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if HEADER not in request.META and QUERY_PARAM not in request.GET:
+            return self.get_response(request)
+        if not self.is_allowed(request):
+            return self.get_response(request)
+        return self.profile(request)
+
+    def is_allowed(self, request):
+        token = request.META.get(HEADER)
+        if token is not None:
+            try:
+                signing.loads(
+                    token, salt=SALT, max_age=settings.USERS_PROFILE_TOKEN_MAX_AGE
+                )
+                return True
+            except signing.BadSignature:
+                return False
+        return request.user.is_staff
+
+    def profile(self, request):
+        recorders = [QueryRecorder(alias) for alias in connections]
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for recorder in recorders:
+                stack.enter_context(
+                    connections[recorder.alias].execute_wrapper(recorder)
+                )
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+
+        queries = [query for recorder in recorders for query in recorder.queries]
+        report_id = self.write_report(request, response, elapsed, queries, profiler)
+        if settings.USERS_PROFILE_SUMMARY_HEADER:
+            sql_time = sum(query["seconds"] for query in queries)
+            response["X-Profile-Summary"] = (
+                f"id={report_id}; total={elapsed * 1000:.1f}ms; "
+                f"sql={len(queries)}/{sql_time * 1000:.1f}ms"
+            )
+        return response
+
+    def write_report(self, request, response, elapsed, queries, profiler):
+        """
+        Writes ``<id>.prof`` for tools reading pstats and ``<id>.json`` with
+        the SQL statements and the top functions, and returns the id.
+        """
+        os.makedirs(settings.USERS_PROFILE_DIR, exist_ok=True)
+        report_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(settings.USERS_PROFILE_DIR, report_id)
+        profiler.dump_stats(f"{path}.prof")
+
+        stats = io.StringIO()
+        pstats.Stats(profiler, stream=stats).sort_stats("cumulative").print_stats(40)
+        report = {
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "seconds": elapsed,
+            "sql": queries,
+            "profile": stats.getvalue(),
+        }
+        with open(f"{path}.json", "w") as f:
+            json.dump(report, f, indent=2)
+        return report_id
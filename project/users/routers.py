@@ -0,0 +1,126 @@
+"""
+Sends the reads of requests that don't write to a replica of the primary.
+
+``ReplicaMiddleware`` marks the requests whose reads may use the replica named
+by ``USERS_READ_DATABASE``: safe methods, from clients that haven't written in
+the last ``USERS_PIN_PRIMARY_SECONDS``. Once a request writes, its later reads
+go to the primary, and a cookie pins the client to the primary for that long,
+so users read their own writes despite replication lag. Reads outside requests,
+such as management commands, always use the primary.
+"""
+
+from contextlib import contextmanager
+from threading import local
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = local()
+
+
+def get_replica():
+    """
+    Returns the alias reads may be sent to, or ``None`` if there is no replica.
+    """
+    alias = settings.USERS_READ_DATABASE
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def reading_from_replica(allowed=True):
+    """
+    Lets reads within the block go to the replica until something is written.
+    """
+    _state.replica_allowed = allowed
+    _state.wrote = False
+    try:
+        yield
+    finally:
+        _state.replica_allowed = False
+
+
+@contextmanager
+def reading_from_primary():
+    """
+    Sends the reads within the block to the primary, for what is cached under
+    versions that the primary's writes replace.
+    """
+    allowed = getattr(_state, "replica_allowed", False)
+    _state.replica_allowed = False
+    try:
+        yield
+    finally:
+        _state.replica_allowed = allowed
+
+
+def has_written():
+    return getattr(_state, "wrote", False)
+
+
+def is_reading_from_replica():
+    """
+    Returns whether reads made now go to the replica. What they return may lag
+    behind the primary, so it must not be cached under versions the primary's
+    writes replace.
+    """
+    if not getattr(_state, "replica_allowed", False) or has_written():
+        return False
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        # reads inside a transaction must see its writes
+        return False
+    return get_replica() is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not is_reading_from_replica():
+            return None
+        return get_replica()
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        # otherwise instances read from the replica would be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, get_replica()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its schema through replication
+        if db == get_replica():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Sends the reads of safe requests to the replica, unless the client wrote recently.
+    """
+
+    cookie_name = "pin_primary"
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        allowed = (
+            request.method in self.safe_methods
+            and self.cookie_name not in request.COOKIES
+        )
+        with reading_from_replica(allowed):
+            response = self.get_response(request)
+            wrote = has_written()
+        if wrote:
+            response.set_cookie(
+                self.cookie_name,
+                "1",
+                max_age=settings.USERS_PIN_PRIMARY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
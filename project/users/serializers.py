@@ -1,8 +1,30 @@
-from django.contrib.auth import get_user_model
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.models import Group
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
+from .models import ADMINS_GROUP_CODENAMES
+
 
 class CustomUserSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        # an optional subset of field names to keep
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def validate_email(self, value):
+        users = get_user_model().objects.filter(email_lower=value.lower())
+        if self.instance is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            raise serializers.ValidationError(
+                _("A user with that email already exists."), code="unique"
+            )
+        return value
+
     def create(self, validated_data):
         user = get_user_model().objects.create_user(**validated_data)
         return user
@@ -10,4 +32,122 @@ class CustomUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = ("uuid", "email", "password")
-        extra_kwargs = {"password": {"write_only": True}}
+        # uniqueness is checked regardless of case by validate_email
+        extra_kwargs = {"password": {"write_only": True}, "email": {"validators": []}}
+
+
+class CustomUserListSerializer(serializers.ListSerializer):
+    """
+    Validates and creates a batch of users with a constant number of queries.
+    """
+
+    def validate(self, attrs):
+        manager = get_user_model().objects
+        emails = [manager.normalize_email(item["email"]).lower() for item in attrs]
+        if len(set(emails)) != len(emails):
+            raise serializers.ValidationError("Emails must be unique within a batch.")
+
+        taken = sorted(
+            manager.filter(email_lower__in=emails).values_list("email", flat=True)
+        )
+        if taken:
+            raise serializers.ValidationError(
+                f"Users with these emails already exist: {', '.join(taken)}."
+            )
+        return attrs
+
+    def create(self, validated_data):
+        return get_user_model().objects.bulk_create_users(validated_data)
+
+
+class BulkCustomUserSerializer(CustomUserSerializer):
+    class Meta(CustomUserSerializer.Meta):
+        read_only_fields = ("uuid",)
+        # uniqueness is checked for the whole batch by the list serializer
+        extra_kwargs = {"password": {"write_only": True}, "email": {"validators": []}}
+        list_serializer_class = CustomUserListSerializer
+
+    def validate_email(self, value):
+        return value
+
+
+class TokenObtainSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+    password = serializers.CharField(
+        style={"input_type": "password"}, trim_whitespace=False, write_only=True
+    )
+
+    def validate(self, attrs):
+        user = authenticate(
+            request=self.context.get("request"),
+            username=attrs["email"],
+            password=attrs["password"],
+        )
+        if user is None:
+            raise serializers.ValidationError(
+                _("Unable to log in with provided credentials."), code="authorization"
+            )
+        attrs["user"] = user
+        return attrs
+
+
+class GrantFilterSerializer(serializers.Serializer):
+    """
+    Selects users by flags and group membership; an empty filter selects everyone.
+    """
+
+    is_active = serializers.BooleanField(required=False)
+    is_staff = serializers.BooleanField(required=False)
+    member_of = serializers.SlugRelatedField(
+        slug_field="name", queryset=Group.objects.all(), required=False
+    )
+
+    def get_queryset(self, filters):
+        filters = dict(filters)
+        group = filters.pop("member_of", None)
+        queryset = get_user_model().objects.filter(**filters)
+        if group is not None:
+            queryset = queryset.filter(groups=group)
+        return queryset
+
+
+class BulkGrantSerializer(serializers.Serializer):
+    """
+    An object permission on many users, for a user or a group, with the users
+    given either as a list of ``uuids`` or as a ``filter``.
+    """
+
+    user = serializers.SlugRelatedField(
+        slug_field="uuid", queryset=get_user_model().objects.all(), required=False
+    )
+    group = serializers.SlugRelatedField(
+        slug_field="name", queryset=Group.objects.all(), required=False
+    )
+    permission = serializers.ChoiceField(choices=ADMINS_GROUP_CODENAMES)
+    uuids = serializers.ListField(
+        child=serializers.UUIDField(), required=False, allow_empty=False
+    )
+    filter = GrantFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        if ("user" in attrs) == ("group" in attrs):
+            raise serializers.ValidationError(_("Give either a user or a group."))
+        if ("uuids" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError(_("Give either uuids or a filter."))
+        return attrs
+
+    def get_target(self):
+        return self.validated_data.get("user") or self.validated_data["group"]
+
+    def get_querysets(self, batch_size):
+        """
+        Yields querysets of the selected users, each small enough for the
+        query parameter limits of the database.
+        """
+        if "filter" in self.validated_data:
+            yield self.fields["filter"].get_queryset(self.validated_data["filter"])
+            return
+        uuids = self.validated_data["uuids"]
+        for start in range(0, len(uuids), batch_size):
+            batch = uuids[start : start + batch_size]
+            yield get_user_model().objects.filter(uuid__in=batch)
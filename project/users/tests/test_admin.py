@@ -0,0 +1,93 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from guardian.shortcuts import assign_perm
+
+from users.pagination import EstimatedCountPaginator
+
+
+class CustomUserAdminTest(TestCase):
+    changelist = "/admin/users/customuser/"
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin_user = User.objects.create_superuser(
+            email="admin@duper.com", password="secret"
+        )
+        cls.alice = User.objects.create_user(email="alice@duper.com")
+        cls.bob = User.objects.create_user(email="bob@duper.com")
+        cls.group = Group.objects.create(name="support")
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def search(self, term):
+        response = self.client.get(self.changelist, {"q": term})
+        self.assertEqual(response.status_code, 200)
+        return [user.email for user in response.context["cl"].result_list]
+
+    def test_search_by_prefix_and_address(self):
+        self.assertEqual(self.search("ali"), ["alice@duper.com"])
+        self.assertEqual(self.search("ALI"), ["alice@duper.com"])
+        self.assertEqual(self.search("alice@DUPER.com"), ["alice@duper.com"])
+        # no substring matches
+        self.assertEqual(self.search("duper"), [])
+        self.assertEqual(len(self.search("")), 4)
+
+    def test_no_full_count(self):
+        response = self.client.get(self.changelist, {"q": "ali"})
+        self.assertIsNone(response.context["cl"].full_result_count)
+        self.assertEqual(response.context["cl"].result_count, 1)
+
+    def test_grants_prefetched(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(self.changelist)
+            return len(queries)
+
+        assign_perm("view_customuser", self.bob, self.alice)
+        # the first request caches the session user
+        count_queries()
+        before = count_queries()
+        for user in get_user_model().objects.exclude(pk=self.admin_user.pk):
+            assign_perm("change_customuser", self.bob, user)
+            assign_perm("view_customuser", self.group, user)
+
+        self.assertEqual(count_queries(), before)
+        response = self.client.get(self.changelist, {"q": "alice@duper.com"})
+        self.assertContains(response, "bob@duper.com: view_customuser")
+        self.assertContains(response, "support: view_customuser")
+
+    def test_object_permissions_view(self):
+        assign_perm("change_customuser", self.bob, self.alice)
+        response = self.client.get(f"{self.changelist}{self.alice.pk}/permissions/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.bob, response.context["users_perms"])
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        User.objects.bulk_create(
+            User(email=f"user{i}@duper.com", password="!") for i in range(5)
+        )
+        self.queryset = User.objects.order_by("pk")
+
+    def test_counts_up_to_limit(self):
+        paginator = EstimatedCountPaginator(self.queryset, 2)
+        self.assertEqual(paginator.count, self.queryset.count())
+        with mock.patch.object(EstimatedCountPaginator, "count_limit", 3):
+            paginator = EstimatedCountPaginator(self.queryset, 2)
+            self.assertEqual(paginator.count, 3)
+            self.assertEqual(paginator.num_pages, 2)
+
+    def test_estimate_for_unfiltered_tables(self):
+        with mock.patch("users.pagination.estimate_rows", return_value=50000):
+            self.assertEqual(EstimatedCountPaginator(self.queryset, 2).count, 50000)
+            filtered = self.queryset.filter(email__startswith="user")
+            self.assertEqual(EstimatedCountPaginator(filtered, 2).count, 5)
@@ -0,0 +1,139 @@
+from django.contrib.auth.models import AnonymousUser, Group, Permission
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from guardian.shortcuts import assign_perm, remove_perm
+from rest_framework.test import APIClient
+
+from users import anonymous, permission_cache
+from users.backends import ObjectPermissionBackend
+from users.models import CustomUser
+
+
+class AnonymousUserCacheTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        permission_cache.get_cache().clear()
+        anonymous.clear()
+        self.anonymous = CustomUser.objects.get(email="Anonymous@anonymous.com")
+        self.user = CustomUser.objects.create_user(email="user@duper.com")
+        self.client = APIClient()
+
+    def tearDown(self):
+        cache.clear()
+        permission_cache.get_cache().clear()
+        anonymous.clear()
+
+    def test_kept_in_memory(self):
+        self.assertEqual(anonymous.get_anonymous_user(), self.anonymous)
+        with self.assertNumQueries(0):
+            user = anonymous.get_anonymous_user()
+            self.assertFalse(anonymous.has_object_grants())
+            self.assertFalse(anonymous.has_perms(["users.view_customuser"]))
+        self.assertEqual(user, self.anonymous)
+
+    def test_refreshed_on_change(self):
+        anonymous.get_entry()
+        self.anonymous.first_name = "Nobody"
+        self.anonymous.save()
+        self.assertEqual(anonymous.get_anonymous_user().first_name, "Nobody")
+
+        assign_perm("view_customuser", self.anonymous, self.user)
+        self.assertTrue(anonymous.has_object_grants())
+        remove_perm("view_customuser", self.anonymous, self.user)
+        self.assertFalse(anonymous.has_object_grants())
+
+        permission = Permission.objects.get(codename="view_customuser")
+        self.anonymous.user_permissions.add(permission)
+        self.anonymous.save()
+        self.assertTrue(anonymous.has_perms(["users.view_customuser"]))
+
+    def test_model_permission_changes_without_save(self):
+        permission = Permission.objects.get(codename="view_customuser")
+        assign_perm("view_customuser", self.anonymous, self.user)
+        self.anonymous.user_permissions.add(permission)
+        response = self.client.get(f"/users/{self.user.uuid}/", format="json")
+        self.assertEqual(response.status_code, 200)
+
+        self.anonymous.user_permissions.remove(permission)
+        response = self.client.get(f"/users/{self.user.uuid}/", format="json")
+        self.assertEqual(response.status_code, 403)
+
+        # and from the permission's side
+        permission.user_set.add(self.anonymous)
+        self.assertTrue(anonymous.has_perms(["users.view_customuser"]))
+        permission.user_set.clear()
+        self.assertFalse(anonymous.has_perms(["users.view_customuser"]))
+
+    def test_group_permission_changes_from_permission_side(self):
+        public = Group.objects.create(name="public")
+        self.anonymous.groups.add(public)
+        permission = Permission.objects.get(codename="view_customuser")
+        self.assertFalse(anonymous.has_perms(["users.view_customuser"]))
+        permission.group_set.add(public)
+        self.assertTrue(anonymous.has_perms(["users.view_customuser"]))
+        permission.group_set.remove(public)
+        self.assertFalse(anonymous.has_perms(["users.view_customuser"]))
+        public.permissions.add(permission)
+        permission.group_set.clear()
+        self.assertFalse(anonymous.has_perms(["users.view_customuser"]))
+
+    def test_group_grants(self):
+        public = Group.objects.create(name="public")
+        self.anonymous.groups.add(public)
+        anonymous.get_entry()
+        assign_perm("view_customuser", public, self.user)
+        self.assertTrue(anonymous.has_object_grants())
+
+        public.permissions.add(Permission.objects.get(codename="view_customuser"))
+        self.assertTrue(anonymous.has_perms(["users.view_customuser"]))
+
+    def test_backend(self):
+        backend = ObjectPermissionBackend()
+        anonymous.get_entry()
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                backend.has_perm(AnonymousUser(), "users.view_customuser", self.user)
+            )
+
+        assign_perm("view_customuser", self.anonymous, self.user)
+        self.assertTrue(
+            backend.has_perm(AnonymousUser(), "users.view_customuser", self.user)
+        )
+        self.assertEqual(
+            backend.get_all_permissions(AnonymousUser(), self.user),
+            ["view_customuser"],
+        )
+
+    def test_backend_other_models(self):
+        backend = ObjectPermissionBackend()
+        public = Group.objects.create(name="public")
+        anonymous.get_entry()
+        assign_perm("auth.change_group", self.anonymous, public)
+        self.assertFalse(anonymous.has_object_grants())
+        self.assertTrue(backend.has_perm(AnonymousUser(), "auth.change_group", public))
+        self.assertEqual(
+            backend.get_all_permissions(AnonymousUser(), public), ["change_group"]
+        )
+
+    def test_requests_without_grants_are_refused_from_memory(self):
+        self.client.get(f"/users/{self.user.uuid}/", format="json")
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/users/{self.user.uuid}/", format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_requests_with_grants(self):
+        other = CustomUser.objects.create_user(email="other@duper.com")
+        self.anonymous.user_permissions.add(
+            Permission.objects.get(codename="view_customuser")
+        )
+        assign_perm("view_customuser", self.anonymous, self.user)
+
+        response = self.client.get(f"/users/{self.user.uuid}/", format="json")
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f"/users/{other.uuid}/", format="json")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/users/", format="json")
+        uuids = [user["uuid"] for user in response.data["results"]]
+        self.assertEqual(uuids, [str(self.user.uuid)])
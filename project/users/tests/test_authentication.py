@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import CustomUser
+
+
+class CachedAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.password = "9823475tyuegrfhjdksis"
+        self.user = CustomUser.objects.create_user(
+            email="cached@duper.com", password=self.password
+        )
+        self.client = APIClient()
+        self.client.login(username=self.user.email, password=self.password)
+
+    def tearDown(self):
+        cache.clear()
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/users/{self.user.uuid}/", format="json")
+        return response, [query["sql"] for query in queries]
+
+    def test_session_and_user_come_from_cache(self):
+        _, first = self.get()
+        response, second = self.get()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(second), len(first) - 1)
+        self.assertFalse([sql for sql in first + second if "django_session" in sql])
+
+    def test_save_invalidates_cached_user(self):
+        _, first = self.get()
+        CustomUser.objects.get(pk=self.user.pk).save()
+        # the user is loaded again
+        _, queries = self.get()
+        self.assertEqual(len(queries), len(first))
+
+    def test_password_change_ends_sessions(self):
+        self.get()
+        self.user.set_password("a new password 8234")
+        self.user.save()
+        response, _ = self.get()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deleted_user_is_logged_out(self):
+        self.get()
+        CustomUser.objects.filter(pk=self.user.pk).delete()
+        response = self.client.get("/users/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_queryset_update_invalidates_cached_user(self):
+        self.get()
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        response, _ = self.get()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_update_invalidates_cached_user(self):
+        self.get()
+        self.user.is_active = False
+        CustomUser.objects.bulk_update([self.user], ["is_active"])
+        response, _ = self.get()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
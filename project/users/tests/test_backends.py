@@ -0,0 +1,69 @@
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from guardian.shortcuts import assign_perm
+
+from users.backends import ImplicitObjectPermissionBackend
+from users.models import (
+    CustomUser,
+    CustomUserGroupObjectPermission,
+    CustomUserUserObjectPermission,
+)
+
+
+class ImplicitObjectPermissionBackendTest(TestCase):
+    def setUp(self):
+        self.backend = ImplicitObjectPermissionBackend()
+        self.staff = CustomUser.objects.create_user(
+            email="staff@duper.com", password="asdlfjaslughf", is_staff=True
+        )
+        self.user = CustomUser.objects.create_user(
+            email="user@duper.com", password="asdfasfgsdfgdfgg"
+        )
+        self.other_user = CustomUser.objects.create_user(
+            email="other@duper.com", password="98743uhgjdf"
+        )
+
+    def test_no_rows_are_stored(self):
+        self.assertFalse(CustomUserUserObjectPermission.objects.exists())
+        self.assertFalse(CustomUserGroupObjectPermission.objects.exists())
+
+    def test_self_permissions_need_no_query(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                self.backend.has_perm(self.user, "change_customuser", self.user)
+            )
+            self.assertTrue(
+                self.backend.has_perm(self.user, "users.delete_customuser", self.user)
+            )
+            self.assertTrue(
+                self.backend.has_perm(self.user, "view_customuser", self.user)
+            )
+
+    def test_self_cant_add(self):
+        self.assertFalse(self.backend.has_perm(self.user, "add_customuser", self.user))
+
+    def test_user_cant_act_on_others(self):
+        self.assertFalse(
+            self.backend.has_perm(self.user, "view_customuser", self.other_user)
+        )
+
+    def test_admins_can_act_on_anyone(self):
+        self.assertTrue(self.backend.has_perm(self.staff, "add_customuser", self.user))
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                self.backend.has_perm(self.staff, "change_customuser", self.other_user)
+            )
+
+    def test_leaving_admins_revokes_rules(self):
+        Group.objects.get(name="admins").user_set.remove(self.staff)
+        staff = CustomUser.objects.get(pk=self.staff.pk)
+        self.assertFalse(self.backend.has_perm(staff, "change_customuser", self.user))
+
+    def test_inactive_user_has_no_permissions(self):
+        self.user.is_active = False
+        self.assertEqual(self.backend.get_all_permissions(self.user, self.user), set())
+
+    def test_explicit_grants_still_apply(self):
+        assign_perm("view_customuser", self.user, self.other_user)
+        self.assertTrue(self.user.has_perm("view_customuser", self.other_user))
+        self.assertFalse(self.user.has_perm("change_customuser", self.other_user))
@@ -0,0 +1,166 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.catalog import catalog
+from users.models import (
+    CustomUser,
+    CustomUserGroupObjectPermission,
+    CustomUserUserObjectPermission,
+)
+
+# where to write the measured queries and timings, if anywhere
+RESULTS_PATH = os.environ.get("USERS_BUDGET_RESULTS")
+results = {}
+
+
+def write_results():
+    if not RESULTS_PATH:
+        return
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+class QueryBudgetMixin:
+    """
+    Seeds ``size`` users with their guardian rows and checks the queries of
+    every user endpoint against a budget that must not grow with the table.
+    """
+
+    size = None
+    # a tenth of the users are granted to the viewer, directly or via a group
+    grant_every = 10
+
+    # queries per request once the session and user are cached; the model
+    # permission check and the cascade of a delete make up most of them; the
+    # m2m_changed receivers on groups and user_permissions keep their rows from
+    # being fast deleted, which costs a select each
+    budgets = {
+        "create": 5,
+        "list": 3,
+        "list_admin": 3,
+        "retrieve": 5,
+        "partial_update": 6,
+        "delete": 15,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(
+            email="budget-admin@duper.com", is_staff=True
+        )
+        cls.viewer = CustomUser.objects.create_user(email="budget-viewer@duper.com")
+        group = Group.objects.create(name="budget-viewers")
+        cls.viewer.groups.add(group)
+
+        users = CustomUser.objects.bulk_create_users(
+            {"email": f"seed{i}@duper.com", "is_staff": i % 100 == 0}
+            for i in range(cls.size)
+        )
+        view = catalog.permission_id("view_customuser")
+        granted = users[:: cls.grant_every]
+        CustomUserUserObjectPermission.objects.bulk_create(
+            CustomUserUserObjectPermission(
+                user=cls.viewer, permission_id=view, content_object=user
+            )
+            for user in granted[::2]
+        )
+        CustomUserGroupObjectPermission.objects.bulk_create(
+            CustomUserGroupObjectPermission(
+                group=group, permission_id=view, content_object=user
+            )
+            for user in granted[1::2]
+        )
+        cls.target = granted[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        write_results()
+
+    def setUp(self):
+        for alias in ("default", settings.USERS_PERMISSION_CACHE):
+            caches[alias].clear()
+        self.client = APIClient()
+
+    def measure(self, name, user, method, path, data=None):
+        self.client.force_login(user)
+        # warm the session and user caches, as on a client's second request
+        self.client.get(f"/users/{user.uuid}/", format="json")
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(self.client, method)(path, data, format="json")
+            elapsed = time.perf_counter() - start
+
+        results[f"{name}@{self.size}"] = {
+            "endpoint": name,
+            "users": self.size,
+            "queries": len(queries),
+            "budget": self.budgets[name],
+            "seconds": round(elapsed, 6),
+        }
+        self.assertLessEqual(
+            len(queries),
+            self.budgets[name],
+            "\n".join(query["sql"] for query in queries),
+        )
+        return response
+
+    def test_create(self):
+        response = self.measure(
+            "create",
+            self.admin,
+            "post",
+            "/users/",
+            {"email": "budget-new@duper.com", "password": "lsdjfoiuwe"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_list(self):
+        response = self.measure("list", self.viewer, "get", "/users/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 100)
+
+    def test_list_admin(self):
+        response = self.measure("list_admin", self.admin, "get", "/users/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve(self):
+        response = self.measure(
+            "retrieve", self.viewer, "get", f"/users/{self.target.uuid}/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_partial_update(self):
+        response = self.measure(
+            "partial_update",
+            self.admin,
+            "patch",
+            f"/users/{self.target.uuid}/",
+            {"email": "budget-changed@duper.com"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delete(self):
+        response = self.measure(
+            "delete", self.admin, "delete", f"/users/{self.target.uuid}/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class QueryBudget1kTest(QueryBudgetMixin, TestCase):
+    size = 1000
+
+
+class QueryBudget10kTest(QueryBudgetMixin, TestCase):
+    size = 10000
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from guardian.shortcuts import assign_perm
+
+from users.checkers import CustomUserPermissionChecker
+from users.models import CustomUser
+
+
+class CustomUserPermissionCheckerTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="user@duper.com", password="asdfasfgsdfgdfgg"
+        )
+        self.others = [
+            CustomUser.objects.create_user(email=f"other{i}@duper.com", password="x")
+            for i in range(3)
+        ]
+        self.support = Group.objects.create(name="support")
+        self.support.user_set.add(self.user)
+
+    def test_get_perms_is_one_query(self):
+        other = self.others[0]
+        assign_perm("view_customuser", self.user, other)
+        assign_perm("change_customuser", self.support, other)
+
+        checker = CustomUserPermissionChecker(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                set(checker.get_perms(other)), {"view_customuser", "change_customuser"}
+            )
+        with self.assertNumQueries(0):
+            checker.get_perms(other)
+
+    def test_prefetch_is_one_query(self):
+        assign_perm("view_customuser", self.user, self.others[0])
+        assign_perm("view_customuser", self.support, self.others[1])
+
+        checker = CustomUserPermissionChecker(self.user)
+        with self.assertNumQueries(1):
+            checker.prefetch_perms(self.others)
+        with self.assertNumQueries(0):
+            self.assertEqual(checker.get_perms(self.others[0]), ["view_customuser"])
+            self.assertEqual(checker.get_perms(self.others[1]), ["view_customuser"])
+            self.assertEqual(checker.get_perms(self.others[2]), [])
+        self.assertTrue(checker.has_perm("users.view_customuser", self.others[1]))
+
+    def test_implicit_perms_need_no_query(self):
+        checker = CustomUserPermissionChecker(self.user)
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                checker.has_perms(
+                    ["users.view_customuser", "users.change_customuser"], self.user
+                )
+            )
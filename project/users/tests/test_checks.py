@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from users.checks import check_default_cache, check_permission_cache
+
+MEMCACHED = {
+    "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+    "LOCATION": "127.0.0.1:11211",
+}
+
+
+@override_settings(USERS_LOCAL_CACHES_ALLOWED=False)
+class PermissionCacheCheckTest(SimpleTestCase):
+    def test_refuses_local_cache(self):
+        errors = check_permission_cache(None)
+        self.assertEqual([error.id for error in errors], ["users.E002"])
+
+    def test_shared_cache(self):
+        caches = dict(settings.CACHES, permissions=MEMCACHED)
+        with self.settings(CACHES=caches):
+            self.assertEqual(check_permission_cache(None), [])
+
+    def test_unknown_alias(self):
+        with self.settings(USERS_PERMISSION_CACHE="missing"):
+            errors = check_permission_cache(None)
+        self.assertEqual([error.id for error in errors], ["users.E001"])
+
+    @override_settings(USERS_LOCAL_CACHES_ALLOWED=True)
+    def test_allowed(self):
+        self.assertEqual(check_permission_cache(None), [])
+
+
+@override_settings(USERS_LOCAL_CACHES_ALLOWED=False)
+class DefaultCacheCheckTest(SimpleTestCase):
+    def test_refuses_local_cache(self):
+        errors = check_default_cache(None)
+        self.assertEqual([error.id for error in errors], ["users.E004"])
+
+    def test_refuses_dummy_cache(self):
+        dummy = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+        caches = dict(settings.CACHES, default=dummy)
+        with self.settings(CACHES=caches, USERS_LOCAL_CACHES_ALLOWED=True):
+            errors = check_default_cache(None)
+        self.assertEqual([error.id for error in errors], ["users.E003"])
+
+    def test_shared_cache(self):
+        caches = dict(settings.CACHES, default=MEMCACHED)
+        with self.settings(CACHES=caches):
+            self.assertEqual(check_default_cache(None), [])
@@ -0,0 +1,38 @@
+from django.forms.models import model_to_dict
+from django.test import TestCase
+
+from users.forms import CustomUserChangeForm, CustomUserCreationForm
+from users.models import CustomUser
+
+
+class UniqueEmailTest(TestCase):
+    def setUp(self):
+        self.taken = CustomUser.objects.create_user(email="dup@duper.com")
+        self.other = CustomUser.objects.create_user(email="other@duper.com")
+
+    def test_creation_form_rejects_email_taken_in_other_case(self):
+        form = CustomUserCreationForm(
+            data={
+                "email": "DUP@duper.com",
+                "password1": "ohdangapassword",
+                "password2": "ohdangapassword",
+            }
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()["email"][0].code, "unique")
+
+    def test_change_form_rejects_email_taken_in_other_case(self):
+        data = model_to_dict(self.other)
+        data["email"] = "DUP@duper.com"
+        form = CustomUserChangeForm(data=data, instance=self.other)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()["email"][0].code, "unique")
+
+    def test_change_form_keeps_own_email(self):
+        data = model_to_dict(self.taken)
+        data["email"] = "Dup@duper.com"
+        form = CustomUserChangeForm(data=data, instance=self.taken)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.taken.refresh_from_db()
+        self.assertEqual(self.taken.email_lower, "dup@duper.com")
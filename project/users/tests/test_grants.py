@@ -0,0 +1,141 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from guardian.shortcuts import assign_perm, get_perms
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import CustomUser, CustomUserGroupObjectPermission
+from users.shortcuts import bulk_assign_perm, bulk_remove_perm
+from users.views import GrantViewSet
+
+
+class BulkGrantShortcutsTest(TestCase):
+    def setUp(self):
+        self.support = Group.objects.create(name="support")
+        self.agent = CustomUser.objects.create_user(email="agent@duper.com")
+        CustomUser.objects.bulk_create(
+            CustomUser(email=f"user{i}@duper.com", password="!") for i in range(5)
+        )
+        self.users = CustomUser.objects.filter(email__startswith="user")
+
+    def test_assign_is_idempotent(self):
+        assign_perm("view_customuser", self.support, self.users.first())
+        # the anti-join and one insert, within a savepoint
+        with self.assertNumQueries(4):
+            created = bulk_assign_perm("view_customuser", self.support, self.users)
+        self.assertEqual(created, 4)
+        self.assertEqual(
+            bulk_assign_perm("view_customuser", self.support, self.users), 0
+        )
+        self.assertEqual(
+            CustomUserGroupObjectPermission.objects.filter(group=self.support).count(),
+            5,
+        )
+
+    def test_remove(self):
+        bulk_assign_perm("change_customuser", self.agent, self.users)
+        some = self.users.filter(email__in=["user0@duper.com", "user1@duper.com"])
+        # one delete, within a savepoint
+        with self.assertNumQueries(3):
+            self.assertEqual(bulk_remove_perm("change_customuser", self.agent, some), 2)
+        self.assertEqual(bulk_remove_perm("change_customuser", self.agent, some), 0)
+        self.assertEqual(
+            get_perms(self.agent, self.users.get(email="user4@duper.com")),
+            ["change_customuser"],
+        )
+
+
+class GrantViewSetTest(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(
+            email="admin@duper.com", is_staff=True
+        )
+        self.agent = CustomUser.objects.create_user(email="agent@duper.com")
+        self.support = Group.objects.create(name="support")
+        self.users = [
+            CustomUser.objects.create_user(email=f"user{i}@duper.com") for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_login(self.admin)
+
+    def post(self, path, data):
+        return self.client.post(path, data, format="json")
+
+    def test_staff_only(self):
+        self.client.force_login(self.agent)
+        response = self.post(
+            "/grants/",
+            {
+                "user": str(self.agent.uuid),
+                "permission": "view_customuser",
+                "filter": {},
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_grant_and_revoke_by_uuids(self):
+        data = {
+            "user": str(self.agent.uuid),
+            "permission": "view_customuser",
+            "uuids": [str(user.uuid) for user in self.users[:2]],
+        }
+        response = self.post("/grants/", data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"changed": 2})
+        self.assertEqual(self.post("/grants/", data).data, {"changed": 0})
+        self.assertTrue(self.agent.has_perm("view_customuser", self.users[0]))
+
+        response = self.post("/grants/revoke/", data)
+        self.assertEqual(response.data, {"changed": 2})
+        agent = CustomUser.objects.get(pk=self.agent.pk)
+        self.assertFalse(agent.has_perm("view_customuser", self.users[0]))
+
+    def test_grant_by_filter(self):
+        self.users[0].groups.add(self.support)
+        self.users[1].groups.add(self.support)
+        data = {
+            "group": "support",
+            "permission": "change_customuser",
+            "filter": {"member_of": "support"},
+        }
+        self.assertEqual(self.post("/grants/", data).data, {"changed": 2})
+        self.assertEqual(
+            set(
+                CustomUserGroupObjectPermission.objects.values_list(
+                    "content_object__email", flat=True
+                )
+            ),
+            {"user0@duper.com", "user1@duper.com"},
+        )
+
+    def test_uuid_batches(self):
+        data = {
+            "group": "support",
+            "permission": "view_customuser",
+            "uuids": [str(user.uuid) for user in self.users],
+        }
+        with mock.patch.object(GrantViewSet, "uuid_batch_size", 2):
+            self.assertEqual(self.post("/grants/", data).data, {"changed": 3})
+
+    def test_validation(self):
+        response = self.post(
+            "/grants/",
+            {
+                "user": str(self.agent.uuid),
+                "group": "support",
+                "permission": "view_customuser",
+                "filter": {},
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post(
+            "/grants/", {"group": "support", "permission": "view_customuser"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post(
+            "/grants/",
+            {"group": "support", "permission": "add_group", "filter": {}},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,88 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from users.hashers import make_passwords
+from users.models import CustomUser
+
+
+class TunedPBKDF2PasswordHasherTest(TestCase):
+    @override_settings(USERS_PBKDF2_ITERATIONS=1000)
+    def test_uses_configured_iterations(self):
+        user = CustomUser.objects.create_user(email="tuned@duper.com", password="x")
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+
+    def test_upgrades_hash_on_login(self):
+        with self.settings(USERS_PBKDF2_ITERATIONS=1000):
+            CustomUser.objects.create_user(
+                email="upgrade@duper.com", password="lsdjfoiuwe"
+            )
+        with self.settings(USERS_PBKDF2_ITERATIONS=2000):
+            self.assertTrue(
+                self.client.login(email="upgrade@duper.com", password="lsdjfoiuwe")
+            )
+        user = CustomUser.objects.get(email="upgrade@duper.com")
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$2000$"))
+
+    def test_keeps_stronger_hash_on_login(self):
+        with self.settings(USERS_PBKDF2_ITERATIONS=2000):
+            CustomUser.objects.create_user(
+                email="strong@duper.com", password="lsdjfoiuwe"
+            )
+        with self.settings(USERS_PBKDF2_ITERATIONS=1000):
+            self.assertTrue(
+                self.client.login(email="strong@duper.com", password="lsdjfoiuwe")
+            )
+        user = CustomUser.objects.get(email="strong@duper.com")
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$2000$"))
+
+
+@override_settings(USERS_PBKDF2_ITERATIONS=1000)
+class MakePasswordsTest(TestCase):
+    def test_hashes_in_worker_processes(self):
+        passwords = ["first", None, "second", "third"]
+        hashes = make_passwords(passwords, workers=2)
+
+        self.assertEqual(len(hashes), 4)
+        self.assertFalse(check_password(None, hashes[1]))
+        for password, encoded in zip(passwords[::2], hashes[::2]):
+            self.assertTrue(check_password(password, encoded))
+
+    def test_bulk_create_users_with_workers(self):
+        (user,) = CustomUser.objects.bulk_create_users(
+            [{"email": "pool@duper.com", "password": "lsdjfoiuwe"}], hash_workers=2
+        )
+        self.assertTrue(user.check_password("lsdjfoiuwe"))
+
+
+class CalibratePasswordHashersTest(TestCase):
+    def test_writes_iterations(self):
+        fd, path = tempfile.mkstemp(suffix=".py")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        call_command(
+            "calibrate_password_hashers",
+            "--samples=2",
+            "--target-ms=5",
+            f"--output={path}",
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        settings = {}
+        with open(path) as f:
+            exec(f.read(), settings)
+        self.assertGreaterEqual(
+            settings["USERS_PBKDF2_ITERATIONS"], PBKDF2PasswordHasher.iterations
+        )
+        self.assertEqual(settings["USERS_PBKDF2_ITERATIONS"] % 1000, 0)
+
+    def test_refuses_floor_below_django_default(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                "calibrate_password_hashers", "--min-iterations=1000", stdout=StringIO()
+            )
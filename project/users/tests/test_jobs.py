@@ -0,0 +1,144 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.jobs import enqueue, run_due_jobs
+from users.models import CustomUser, Job
+
+calls = []
+
+
+def record(**kwargs):
+    calls.append(kwargs)
+
+
+def explode(**kwargs):
+    raise ValueError("boom")
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_runs_and_deletes(self):
+        enqueue(record, value=1)
+        enqueue("users.tests.test_jobs.record", value=2)
+        self.assertEqual(run_due_jobs(), 2)
+        self.assertEqual(calls, [{"value": 1}, {"value": 2}])
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(run_due_jobs(), 0)
+
+    @override_settings(USERS_JOB_MAX_ATTEMPTS=2, USERS_JOB_RETRY_DELAY=10)
+    def test_retries_then_fails(self):
+        job = enqueue(explode)
+        run_due_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("ValueError: boom", job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=5))
+
+        # not due yet
+        self.assertEqual(run_due_jobs(), 0)
+        Job.objects.update(run_after=timezone.now())
+        run_due_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        Job.objects.update(run_after=timezone.now())
+        self.assertEqual(run_due_jobs(), 0)
+
+    def test_stale_running_jobs_are_retried(self):
+        enqueue(record, value=1)
+        Job.objects.update(status=Job.RUNNING, run_after=timezone.now() + timedelta(1))
+        self.assertEqual(run_due_jobs(), 0)
+        Job.objects.update(run_after=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(run_due_jobs(), 1)
+        self.assertEqual(calls, [{"value": 1}])
+
+    @override_settings(USERS_JOB_MAX_ATTEMPTS=2)
+    def test_jobs_killing_their_worker_fail(self):
+        job = enqueue(record, value=1)
+        # the worker died during the last attempt
+        Job.objects.update(
+            status=Job.RUNNING,
+            attempts=2,
+            run_after=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(run_due_jobs(), 0)
+        self.assertEqual(calls, [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn("worker stopped", job.last_error)
+
+    def test_claimed_once(self):
+        enqueue(record, value=1)
+        with mock.patch("users.jobs.claim", return_value=False):
+            self.assertEqual(run_due_jobs(), 0)
+        self.assertEqual(calls, [])
+
+    def test_command(self):
+        enqueue(record, value=1)
+        out = StringIO()
+        call_command("run_jobs", "--once", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "1 jobs run")
+        self.assertEqual(calls, [{"value": 1}])
+
+    def test_command_prunes_failed_jobs(self):
+        old = enqueue(explode)
+        recent = enqueue(explode)
+        pending = enqueue(record, value=1)
+        Job.objects.filter(pk=old.pk).update(
+            status=Job.FAILED, run_after=timezone.now() - timedelta(days=8)
+        )
+        Job.objects.filter(pk=recent.pk).update(
+            status=Job.FAILED, run_after=timezone.now() - timedelta(days=6)
+        )
+        Job.objects.filter(pk=pending.pk).update(
+            run_after=timezone.now() + timedelta(days=1)
+        )
+        out = StringIO()
+        call_command("run_jobs", "--once", "--prune-failed=7", stdout=out)
+        self.assertIn("1 failed jobs deleted", out.getvalue())
+        self.assertEqual(
+            set(Job.objects.values_list("pk", flat=True)), {recent.pk, pending.pk}
+        )
+
+
+class WelcomeEmailTest(TestCase):
+    def test_off_by_default(self):
+        CustomUser.objects.create_user(email="new@duper.com")
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(USERS_WELCOME_EMAIL=True)
+    def test_queued_on_signup(self):
+        admin = CustomUser.objects.create_user(email="admin@duper.com", is_staff=True)
+        client = APIClient()
+        client.force_login(admin)
+        response = client.post(
+            "/users/", {"email": "new@duper.com", "password": "x"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        CustomUser.objects.bulk_create_users([{"email": "bulk@duper.com"}])
+        # sent by the worker, not the request
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(run_due_jobs(), 3)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["admin@duper.com", "bulk@duper.com", "new@duper.com"],
+        )
+
+    @override_settings(USERS_WELCOME_EMAIL=True)
+    def test_skips_deleted_users(self):
+        user = CustomUser.objects.create_user(email="new@duper.com")
+        user.delete()
+        self.assertEqual(run_due_jobs(), 1)
+        self.assertEqual(mail.outbox, [])
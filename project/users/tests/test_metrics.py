@@ -0,0 +1,194 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from users.metrics import Counter, Histogram, registry
+from users.models import CustomUser
+
+
+def sample(text, line):
+    """Returns the value of the sample ``line`` in the exposition ``text``."""
+    for row in text.splitlines():
+        name, _, value = row.rpartition(" ")
+        if name == line:
+            return float(value)
+    return None
+
+
+class MetricsEndpointTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.admin = CustomUser.objects.create_user(
+            email="admin@duper.com", is_staff=True
+        )
+        self.user = CustomUser.objects.create_user(email="user@duper.com")
+        self.other = CustomUser.objects.create_user(email="other@duper.com")
+        self.client = APIClient()
+
+    def get_metrics(self):
+        self.client.force_login(self.admin)
+        response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response["Content-Type"].startswith("text/plain; version=0.0.4")
+        )
+        return response.content.decode()
+
+    def test_staff_only(self):
+        response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.user)
+        response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_requests_by_view(self):
+        self.client.force_login(self.admin)
+        self.client.get("/users/", format="json")
+        self.client.get("/users/", format="json")
+
+        text = self.get_metrics()
+        self.assertIn("# TYPE users_request_seconds histogram", text)
+        labels = '{view="user-list",method="GET"}'
+        self.assertEqual(sample(text, f"users_request_seconds_count{labels}"), 2)
+        self.assertEqual(sample(text, f"users_request_queries_count{labels}"), 2)
+        self.assertEqual(
+            sample(
+                text,
+                'users_request_queries_bucket{view="user-list",method="GET",le="0.0"}',
+            ),
+            0,
+        )
+
+    def test_permission_decisions(self):
+        self.client.force_login(self.user)
+        self.client.get(f"/users/{self.user.uuid}/", format="json")
+        self.client.get(f"/users/{self.other.uuid}/", format="json")
+
+        text = self.get_metrics()
+        checks = "users_permission_checks_total"
+        self.assertEqual(
+            sample(text, f'{checks}{{check="object",decision="allow"}}'), 1
+        )
+        # the other user is filtered out of the queryset before the object check
+        self.assertEqual(sample(text, f'{checks}{{check="model",decision="allow"}}'), 2)
+
+    def test_hot_paths(self):
+        registry.reset()
+        CustomUser.objects.create_user(email="new@duper.com", password="secret")
+
+        text = self.get_metrics()
+        self.assertEqual(sample(text, "users_password_hash_seconds_count"), 1)
+        self.assertEqual(
+            sample(text, 'users_user_post_save_seconds_count{created="True"}'), 1
+        )
+
+
+class RegistryTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        self.counter = Counter("test_events_total", "Events.", ["kind"])
+        self.histogram = Histogram("test_seconds", "Durations.", buckets=(1, 2))
+        self.addCleanup(registry.metrics.pop, self.counter.name)
+        self.addCleanup(registry.metrics.pop, self.histogram.name)
+
+    def test_sums_processes(self):
+        with override_settings(USERS_METRICS_DIR=self.metrics_dir):
+            self.counter.inc(kind="a")
+            self.histogram.observe(0.5)
+            path = os.path.join(self.metrics_dir, f"{os.getpid()}-other.json")
+            with open(path, "w") as f:
+                json.dump(
+                    {
+                        "test_events_total": [[["a"], 2], [["b"], 1]],
+                        "test_seconds": [[[], [0, 1, 1, 4.5]]],
+                    },
+                    f,
+                )
+            text = registry.render()
+
+        self.assertTrue(os.path.exists(registry.get_path(self.metrics_dir)))
+        self.assertEqual(sample(text, 'test_events_total{kind="a"}'), 3)
+        self.assertEqual(sample(text, 'test_events_total{kind="b"}'), 1)
+        self.assertEqual(sample(text, 'test_seconds_bucket{le="1.0"}'), 1)
+        self.assertEqual(sample(text, 'test_seconds_bucket{le="2.0"}'), 2)
+        self.assertEqual(sample(text, 'test_seconds_bucket{le="+Inf"}'), 3)
+        self.assertEqual(sample(text, "test_seconds_sum"), 5)
+        self.assertEqual(sample(text, "test_seconds_count"), 3)
+
+    def test_flush_interval(self):
+        with override_settings(
+            USERS_METRICS_DIR=self.metrics_dir, USERS_METRICS_FLUSH_INTERVAL=60
+        ):
+            registry.flush()
+            self.counter.inc(kind="a")
+            registry.flush()
+            with open(registry.get_path(self.metrics_dir)) as f:
+                self.assertNotIn("test_events_total", json.load(f))
+
+    def write_exited(self, name, values):
+        with open(os.path.join(self.metrics_dir, name), "w") as f:
+            json.dump({"test_events_total": [[["a"], values]]}, f)
+
+    def test_exited_workers_are_folded(self):
+        self.write_exited("999999999-old.json", 2)
+        self.write_exited("999999999-older.json", 3)
+        with override_settings(USERS_METRICS_DIR=self.metrics_dir):
+            self.counter.inc(kind="a")
+            text = registry.render()
+            self.assertEqual(sample(text, 'test_events_total{kind="a"}'), 6)
+            self.assertEqual(
+                sorted(os.listdir(self.metrics_dir)),
+                sorted(
+                    [
+                        ".lock",
+                        "exited.json",
+                        os.path.basename(registry.get_path(self.metrics_dir)),
+                    ]
+                ),
+            )
+
+            self.write_exited("999999999-newer.json", 4)
+            text = registry.render()
+            self.assertEqual(sample(text, 'test_events_total{kind="a"}'), 10)
+
+    def test_folded_files_left_behind_count_once(self):
+        self.write_exited("999999999-old.json", 2)
+        with open(os.path.join(self.metrics_dir, "exited.json"), "w") as f:
+            json.dump(
+                {
+                    "folded": ["999999999-old.json"],
+                    "values": {"test_events_total": [[["a"], 2]]},
+                },
+                f,
+            )
+        with override_settings(USERS_METRICS_DIR=self.metrics_dir):
+            text = registry.render()
+        self.assertEqual(sample(text, 'test_events_total{kind="a"}'), 2)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.metrics_dir, "999999999-old.json"))
+        )
+
+    def test_new_process_gets_own_file(self):
+        path = registry.get_path(self.metrics_dir)
+        with mock.patch("users.metrics.os.getpid", return_value=registry.pid):
+            registry.reset()
+        self.assertNotEqual(registry.get_path(self.metrics_dir), path)
+
+    def test_forked_process_starts_empty(self):
+        self.counter.inc(kind="a")
+        with mock.patch("users.metrics.os.getpid", return_value=os.getpid() + 1):
+            self.counter.inc(kind="b")
+            text = registry.render()
+        self.assertIsNone(sample(text, 'test_events_total{kind="a"}'))
+        self.assertEqual(sample(text, 'test_events_total{kind="b"}'), 1)
+
+    def test_labels_are_checked(self):
+        with self.assertRaises(ValueError):
+            self.counter.inc(other="a")
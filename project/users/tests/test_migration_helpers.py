@@ -0,0 +1,37 @@
+from django.test import TransactionTestCase
+
+from users.migration_helpers import run_in_batches
+from users.models import CustomUser
+
+
+class RunInBatchesTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def setUp(self):
+        CustomUser.objects.bulk_create_users(
+            [{"email": f"batch{i}@duper.com"} for i in range(5)]
+        )
+        self.users = CustomUser.objects.filter(email__startswith="batch")
+
+    def test_walks_rows_in_bounded_batches(self):
+        sizes = []
+        done = run_in_batches(self.users, lambda batch: sizes.append(len(batch)), 2)
+        self.assertEqual(done, 5)
+        self.assertEqual(sizes, [2, 2, 1])
+
+    def test_resumes_after_interruption(self):
+        pending = self.users.filter(is_active=True)
+        interrupt = iter([False, True])
+
+        def deactivate(batch):
+            if next(interrupt, False):
+                raise RuntimeError("interrupted")
+            pending.filter(pk__in=[user.pk for user in batch]).update(is_active=False)
+
+        with self.assertRaises(RuntimeError):
+            run_in_batches(pending, deactivate, 2)
+        # the first batch was committed, the interrupted one rolled back
+        self.assertEqual(pending.count(), 3)
+
+        self.assertEqual(run_in_batches(pending, deactivate, 2), 3)
+        self.assertFalse(pending.exists())
@@ -1,7 +1,27 @@
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models.functions import Lower
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from guardian.models import GroupObjectPermission, UserObjectPermission
+from guardian.shortcuts import assign_perm
 
-from users.models import CustomUser
+from users.catalog import catalog
+from users.models import (
+    ADMINS_GROUP_CODENAMES,
+    CustomUser,
+    CustomUserGroupObjectPermission,
+    CustomUserUserObjectPermission,
+    assign_admins_group_perms,
+)
 from users.models import get_anonymous_user_instance
 
 
@@ -116,8 +136,234 @@ class CustomUserUuidTest(TestCase):
         self.assertIsNotNone(user.uuid)
 
 
+class CustomUserEmailLowerTest(TestCase):
+    def test_kept_in_step(self):
+        user = CustomUser.objects.create_user(email="Mixed.Case@Duper.com")
+        self.assertEqual(user.email_lower, "mixed.case@duper.com")
+
+        user.email = "Other@duper.com"
+        user.save(update_fields=["email"])
+        user.refresh_from_db()
+        self.assertEqual(user.email_lower, "other@duper.com")
+
+        CustomUser.objects.bulk_create([CustomUser(email="Bulk@Duper.com")])
+        self.assertTrue(
+            CustomUser.objects.filter(email_lower="bulk@duper.com").exists()
+        )
+
+    def test_kept_in_step_by_bulk_writes(self):
+        user = CustomUser.objects.create_user(email="first@duper.com")
+        CustomUser.objects.filter(pk=user.pk).update(email="Second@Duper.com")
+        user.refresh_from_db()
+        self.assertEqual(user.email_lower, "second@duper.com")
+        with self.assertRaises(TypeError):
+            CustomUser.objects.filter(pk=user.pk).update(email=Lower("email"))
+
+        user.email = "Third@Duper.com"
+        CustomUser.objects.bulk_update([user], ["email"])
+        user.refresh_from_db()
+        self.assertEqual(user.email_lower, "third@duper.com")
+
+    def test_backfill_finds_non_ascii_clashes(self):
+        populate = import_module(
+            "users.migrations.0012_customuser_populate_email_lower"
+        ).populate_email_lower
+        CustomUser.objects.create_user(email="Élodie@duper.com")
+        other = CustomUser.objects.create_user(email="other@duper.com")
+        # as the column was before 0012, which SQLite's LOWER would let through
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE users_customuser SET email = %s WHERE id = %s",
+                ["élodie@duper.com", other.pk],
+            )
+        schema_editor = mock.Mock(connection=connection)
+        with self.assertRaisesMessage(RuntimeError, "élodie@duper.com"):
+            populate(apps, schema_editor)
+
+    def test_natural_key_ignores_case(self):
+        user = CustomUser.objects.create_user(email="Mixed.Case@duper.com")
+        with self.assertNumQueries(1):
+            found = CustomUser.objects.get_by_natural_key("mixed.case@DUPER.com")
+        self.assertEqual(found, user)
+
+    def test_unique_regardless_of_case(self):
+        CustomUser.objects.create_user(email="same@duper.com")
+        with self.assertRaises(IntegrityError):
+            CustomUser.objects.create_user(email="Same@duper.com")
+
+
 class AnonyousUserTest(TestCase):
     def test_returns_anonymous_user(self):
         user = get_anonymous_user_instance(CustomUser)
         self.assertEqual(user.email, "Anonymous@anonymous.com")
         self.assertFalse(user.is_staff)
+
+
+class BulkCreateUsersTest(TestCase):
+    def test_same_permissions_as_create_user(self):
+        single = CustomUser.objects.create_user(email="single@duper.com", password="x")
+        bulk, staff = CustomUser.objects.bulk_create_users(
+            [
+                {"email": "bulk@duper.com", "password": "lsdjfoiuwe"},
+                {
+                    "email": "staff@duper.com",
+                    "password": "lsdjfoiuwe",
+                    "is_staff": True,
+                },
+            ]
+        )
+
+        self.assertTrue(bulk.check_password("lsdjfoiuwe"))
+        self.assertEqual(
+            bulk.get_all_permissions(bulk), single.get_all_permissions(single)
+        )
+        self.assertEqual(bulk.get_all_permissions(), single.get_all_permissions())
+        admins_group = Group.objects.get(name="admins")
+        self.assertFalse(bulk.groups.filter(pk=admins_group.pk).exists())
+        self.assertTrue(staff.groups.filter(pk=admins_group.pk).exists())
+
+    def test_query_count_does_not_grow_with_batch(self):
+        def batch(prefix, size):
+            return [{"email": f"{prefix}{i}@duper.com"} for i in range(size)]
+
+        # warm the content type cache
+        CustomUser.objects.bulk_create_users(batch("warm", 1))
+        with CaptureQueriesContext(connection) as small:
+            CustomUser.objects.bulk_create_users(batch("small", 2))
+        with CaptureQueriesContext(connection) as large:
+            CustomUser.objects.bulk_create_users(batch("large", 50))
+        self.assertEqual(len(small), len(large))
+
+    def test_rejects_duplicate_emails(self):
+        with self.assertRaises(ValueError):
+            CustomUser.objects.bulk_create_users(
+                [{"email": "dupe@duper.com"}, {"email": "dupe@duper.com"}]
+            )
+
+
+class BulkDeleteUsersTest(TestCase):
+    def create_granted_users(self, prefix, size):
+        viewer = CustomUser.objects.create_user(email=f"{prefix}viewer@duper.com")
+        group = Group.objects.create(name=f"{prefix}viewers")
+        users = CustomUser.objects.bulk_create_users(
+            [{"email": f"{prefix}{i}@duper.com"} for i in range(size)]
+        )
+        for user in users:
+            assign_perm("view_customuser", viewer, user)
+            assign_perm("view_customuser", group, user)
+        return CustomUser.objects.filter(email__startswith=prefix).exclude(pk=viewer.pk)
+
+    def test_deletes_grants_on_deleted_users(self):
+        users = self.create_granted_users("gone", 3)
+        deleted, rows = users.delete()
+
+        self.assertEqual(rows["users.CustomUser"], 3)
+        self.assertEqual(rows["users.CustomUserUserObjectPermission"], 3)
+        self.assertEqual(rows["users.CustomUserGroupObjectPermission"], 3)
+        self.assertFalse(CustomUserUserObjectPermission.objects.exists())
+        self.assertFalse(CustomUserGroupObjectPermission.objects.exists())
+
+    def test_single_delete_cascades_to_grants(self):
+        users = self.create_granted_users("single", 1)
+        users.get().delete()
+        self.assertFalse(CustomUserUserObjectPermission.objects.exists())
+        self.assertFalse(CustomUserGroupObjectPermission.objects.exists())
+
+    def test_assign_perm_uses_direct_tables(self):
+        self.create_granted_users("direct", 1)
+        self.assertFalse(UserObjectPermission.objects.exists())
+        self.assertFalse(GroupObjectPermission.objects.exists())
+        self.assertEqual(CustomUserUserObjectPermission.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        small = self.create_granted_users("small", 2)
+        large = self.create_granted_users("large", 20)
+        with CaptureQueriesContext(connection) as small_queries:
+            small.delete()
+        with CaptureQueriesContext(connection) as large_queries:
+            large.delete()
+        self.assertEqual(len(small_queries), len(large_queries))
+
+
+class SweepOrphanedPermissionsTest(TestCase):
+    def setUp(self):
+        viewer = CustomUser.objects.create_user(email="viewer@duper.com")
+        self.kept = CustomUser.objects.create_user(email="kept@duper.com")
+        # a generic grant on an existing user, then three on users deleted
+        # before grants moved to the foreign key tables
+        UserObjectPermission.objects.bulk_create(
+            UserObjectPermission(
+                user=viewer,
+                permission_id=catalog.permission_id("view_customuser"),
+                content_type_id=catalog.content_type_id,
+                object_pk=str(self.kept.pk + i),
+            )
+            for i in range(4)
+        )
+
+    def sweep(self, *args):
+        out = StringIO()
+        call_command("sweep_orphaned_permissions", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_only_counts(self):
+        out = self.sweep("--dry-run")
+        self.assertIn("guardian.UserObjectPermission: 3 orphaned", out)
+        self.assertEqual(UserObjectPermission.objects.count(), 4)
+
+    def test_deletes_orphans_in_batches(self):
+        out = self.sweep("--batch-size=2")
+        self.assertIn("guardian.UserObjectPermission: 3 deleted", out)
+        self.assertEqual(
+            list(UserObjectPermission.objects.values_list("object_pk", flat=True)),
+            [str(self.kept.pk)],
+        )
+
+
+class PermissionCatalogTest(TestCase):
+    def test_create_user_queries(self):
+        # insert the user and their model permissions; the admins group's are
+        # given after migrating
+        with self.assertNumQueries(2):
+            CustomUser.objects.create_user(email="user@duper.com", password="x")
+
+    def test_create_staff_queries(self):
+        # and one more to put staff in the admins group
+        with self.assertNumQueries(3):
+            CustomUser.objects.create_user(
+                email="staff@duper.com", password="x", is_staff=True
+            )
+
+    def test_catalog_matches_database(self):
+        self.assertEqual(catalog.admins_group_id, Group.objects.get(name="admins").pk)
+        self.assertEqual(
+            catalog.permission_id("view_customuser"),
+            Permission.objects.get(codename="view_customuser").pk,
+        )
+        self.assertEqual(
+            catalog.content_type_id, ContentType.objects.get_for_model(CustomUser).pk
+        )
+
+    def test_loading_the_app_does_not_query(self):
+        catalog.clear()
+        with self.assertNumQueries(0):
+            apps.get_app_config("users").ready()
+        self.assertEqual(catalog.admins_group_id, Group.objects.get(name="admins").pk)
+
+    def test_admins_group_perms_given_after_migrating(self):
+        admins = Group.objects.get(name="admins")
+        admins.permissions.clear()
+        assign_admins_group_perms()
+        self.assertEqual(
+            set(admins.permissions.values_list("codename", flat=True)),
+            set(ADMINS_GROUP_CODENAMES),
+        )
+
+    def test_admins_group_change_clears_catalog(self):
+        # the rollback at the end of the test isn't signalled
+        self.addCleanup(catalog.clear)
+        Group.objects.get(name="admins").delete()
+        with self.assertRaises(Group.DoesNotExist):
+            catalog.admins_group_id
+        admins_group = Group.objects.create(name="admins")
+        self.assertEqual(catalog.admins_group_id, admins_group.pk)
@@ -0,0 +1,101 @@
+import shutil
+import tempfile
+
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from guardian.shortcuts import assign_perm, remove_perm
+
+from users import permission_cache
+from users.checkers import CustomUserPermissionChecker
+from users.models import CustomUser
+
+
+class PermissionCacheTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def setUp(self):
+        permission_cache.get_cache().clear()
+        permission_cache.reset_stats()
+        self.user = CustomUser.objects.create_user(
+            email="user@duper.com", password="asdfasfgsdfgdfgg"
+        )
+        self.other_user = CustomUser.objects.create_user(
+            email="other@duper.com", password="98743uhgjdf"
+        )
+        self.support = Group.objects.create(name="support")
+
+    def tearDown(self):
+        permission_cache.get_cache().clear()
+
+    def get_perms(self):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        return set(CustomUserPermissionChecker(user).get_perms(self.other_user))
+
+    def test_second_request_hits_cache(self):
+        assign_perm("view_customuser", self.user, self.other_user)
+        self.assertEqual(self.get_perms(), {"view_customuser"})
+
+        checker = CustomUserPermissionChecker(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(checker.get_perms(self.other_user), ["view_customuser"])
+        self.assertEqual(permission_cache.get_stats(), {"hits": 1, "misses": 1})
+
+    def test_prefetch_fills_cache(self):
+        CustomUserPermissionChecker(self.user).prefetch_perms([self.other_user])
+
+        checker = CustomUserPermissionChecker(self.user)
+        with self.assertNumQueries(0):
+            checker.prefetch_perms([self.other_user])
+            self.assertEqual(checker.get_perms(self.other_user), [])
+
+    def test_user_grants_invalidate(self):
+        self.assertEqual(self.get_perms(), set())
+        assign_perm("view_customuser", self.user, self.other_user)
+        self.assertEqual(self.get_perms(), {"view_customuser"})
+        remove_perm("view_customuser", self.user, self.other_user)
+        self.assertEqual(self.get_perms(), set())
+
+    def test_group_grants_invalidate(self):
+        self.support.user_set.add(self.user)
+        self.assertEqual(self.get_perms(), set())
+        assign_perm("change_customuser", self.support, self.other_user)
+        self.assertEqual(self.get_perms(), {"change_customuser"})
+
+    def test_membership_invalidates(self):
+        assign_perm("change_customuser", self.support, self.other_user)
+        self.assertEqual(self.get_perms(), set())
+        self.user.groups.add(self.support)
+        self.assertEqual(self.get_perms(), {"change_customuser"})
+        self.support.user_set.clear()
+        self.assertEqual(self.get_perms(), set())
+
+    def test_nothing_cached_inside_transactions(self):
+        with transaction.atomic():
+            assign_perm("view_customuser", self.user, self.other_user)
+            self.assertEqual(self.get_perms(), {"view_customuser"})
+            transaction.set_rollback(True)
+        self.assertEqual(self.get_perms(), set())
+
+
+class FileBasedPermissionCacheTest(PermissionCacheTest):
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.cache_settings = override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "permissions": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": cls.cache_dir,
+                },
+            }
+        )
+        cls.cache_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.cache_settings.disable()
+        shutil.rmtree(cls.cache_dir)
@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from users.models import CustomUser
+from users.profiling import make_profile_token
+
+
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        override = override_settings(USERS_PROFILE_DIR=self.profile_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.admin = CustomUser.objects.create_user(
+            email="admin@duper.com", is_staff=True
+        )
+        self.user = CustomUser.objects.create_user(email="user@duper.com")
+        self.client = APIClient()
+
+    def reports(self):
+        return sorted(os.listdir(self.profile_dir))
+
+    def test_untriggered_requests_are_not_profiled(self):
+        self.client.force_login(self.admin)
+        with mock.patch("users.profiling.cProfile.Profile") as profile:
+            response = self.client.get("/users/", format="json")
+        profile.assert_not_called()
+        self.assertNotIn("X-Profile-Summary", response)
+        self.assertEqual(self.reports(), [])
+
+    def test_staff_query_flag(self):
+        self.client.force_login(self.admin)
+        response = self.client.get("/users/?profile=1", format="json")
+
+        self.assertEqual(response.status_code, 200)
+        report_id = response["X-Profile-Summary"].split(";")[0][len("id=") :]
+        self.assertEqual(self.reports(), [f"{report_id}.json", f"{report_id}.prof"])
+        with open(os.path.join(self.profile_dir, f"{report_id}.json")) as f:
+            report = json.load(f)
+        self.assertEqual(report["path"], "/users/?profile=1")
+        self.assertTrue(report["sql"])
+        self.assertIn(
+            "users/views.py", "".join(q["call_site"] or "" for q in report["sql"])
+        )
+        self.assertIn("cumulative", report["profile"])
+
+    def test_query_flag_ignored_for_non_staff(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/users/?profile=1", format="json")
+        self.assertNotIn("X-Profile-Summary", response)
+        self.assertEqual(self.reports(), [])
+
+    def test_signed_header(self):
+        response = self.client.get(
+            "/users/", format="json", HTTP_X_PROFILE=make_profile_token()
+        )
+        self.assertIn("X-Profile-Summary", response)
+
+    def test_forged_header(self):
+        response = self.client.get("/users/", format="json", HTTP_X_PROFILE="profile")
+        self.assertNotIn("X-Profile-Summary", response)
+        self.assertEqual(self.reports(), [])
@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import tempfile
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from guardian.shortcuts import assign_perm, remove_perm
+from rest_framework.test import APIClient
+
+from users import anonymous, permission_cache
+from users.checkers import CustomUserPermissionChecker
+from users.models import CustomUser
+from users.routers import (
+    ReplicaMiddleware,
+    ReplicaRouter,
+    is_reading_from_replica,
+    reading_from_replica,
+)
+
+
+@override_settings(USERS_READ_DATABASE="replica")
+class ReplicaRouterTest(SimpleTestCase):
+    databases = {"default"}
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_use_primary_outside_requests(self):
+        self.assertIsNone(self.router.db_for_read(CustomUser))
+
+    def test_reads_use_replica_until_a_write(self):
+        with reading_from_replica():
+            self.assertEqual(self.router.db_for_read(CustomUser), "replica")
+            self.router.db_for_write(CustomUser)
+            self.assertIsNone(self.router.db_for_read(CustomUser))
+
+    def test_reads_in_transactions_use_primary(self):
+        with reading_from_replica(), transaction.atomic():
+            self.assertIsNone(self.router.db_for_read(CustomUser))
+            self.assertFalse(is_reading_from_replica())
+
+    @override_settings(USERS_READ_DATABASE=None)
+    def test_no_replica_configured(self):
+        with reading_from_replica():
+            self.assertIsNone(self.router.db_for_read(CustomUser))
+
+    def test_migrations_stay_on_primary(self):
+        self.assertFalse(self.router.allow_migrate("replica", "users"))
+        self.assertIsNone(self.router.allow_migrate("default", "users"))
+
+
+# The replica mirrors the test database, which its connection can only read
+# outside of TestCase's transaction.
+@override_settings(USERS_READ_DATABASE="replica")
+class ReplicaMiddlewareTest(TransactionTestCase):
+    databases = {"default", "replica"}
+    serialized_rollback = True
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="reader@duper.com", password="9823475tyuegrfhjdksis"
+        )
+        self.client = APIClient()
+        self.client.force_login(self.user)
+
+    def get(self, path):
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            with CaptureQueriesContext(connections["default"]) as primary:
+                response = self.client.get(path, format="json")
+        return response, len(replica), len(primary)
+
+    def test_reads_go_to_replica(self):
+        # the session user is loaded from the primary once, then cached
+        self.get("/users/")
+        response, replica, primary = self.get("/users/")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(replica, 0)
+        self.assertEqual(primary, 0)
+        self.assertNotIn(ReplicaMiddleware.cookie_name, response.cookies)
+
+    def test_writes_pin_client_to_primary(self):
+        response = self.client.patch(
+            f"/users/{self.user.uuid}/", {"email": "pinned@duper.com"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        cookie = response.cookies[ReplicaMiddleware.cookie_name]
+        self.assertEqual(cookie["max-age"], 5)
+
+        response, replica, primary = self.get(f"/users/{self.user.uuid}/")
+        self.assertEqual(response.data["email"], "pinned@duper.com")
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+
+@override_settings(USERS_READ_DATABASE="replica")
+class LaggingReplicaTest(TransactionTestCase):
+    """
+    Reads a copy of the test database taken before the latest writes, as a
+    replica behind on replication would return.
+    """
+
+    databases = {"default", "replica"}
+    serialized_rollback = True
+
+    def setUp(self):
+        self.viewer = CustomUser.objects.create_user(email="viewer@duper.com")
+        self.target = CustomUser.objects.create_user(email="target@duper.com")
+        self.clear_caches()
+        self.addCleanup(self.clear_caches)
+
+    def clear_caches(self):
+        cache.clear()
+        permission_cache.get_cache().clear()
+        anonymous.clear()
+
+    def lag_replica(self):
+        """
+        Points the replica at a snapshot of the primary as it is now.
+        """
+        fd, path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        primary = connections["default"]
+        primary.ensure_connection()
+        snapshot = sqlite3.connect(path)
+        primary.connection.backup(snapshot)
+        snapshot.close()
+
+        replica = connections["replica"]
+        settings_dict = replica.settings_dict
+        replica.close()
+        replica.settings_dict = dict(settings_dict, NAME=path)
+
+        def restore():
+            replica.close()
+            replica.settings_dict = settings_dict
+
+        self.addCleanup(restore)
+
+    def test_revoked_grant_is_not_cached_from_replica(self):
+        assign_perm("view_customuser", self.viewer, self.target)
+        self.lag_replica()
+        remove_perm("view_customuser", self.viewer, self.target)
+
+        with reading_from_replica():
+            checker = CustomUserPermissionChecker(self.viewer)
+            # the replica still has the grant
+            self.assertTrue(checker.has_perm("view_customuser", self.target))
+
+        checker = CustomUserPermissionChecker(self.viewer)
+        self.assertFalse(checker.has_perm("view_customuser", self.target))
+
+    def test_anonymous_entry_is_not_kept_from_replica(self):
+        anonymous_user = CustomUser.objects.get(email="Anonymous@anonymous.com")
+        assign_perm("view_customuser", anonymous_user, self.target)
+        self.lag_replica()
+        remove_perm("view_customuser", anonymous_user, self.target)
+
+        with reading_from_replica():
+            self.assertTrue(anonymous.has_object_grants())
+        self.assertFalse(anonymous.has_object_grants())
+
+    def test_lists_from_replica_carry_no_validators(self):
+        client = APIClient()
+        client.force_login(self.viewer)
+        self.lag_replica()
+        response = client.get("/users/", format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+        client.cookies[ReplicaMiddleware.cookie_name] = "1"
+        response = client.get("/users/", format="json")
+        self.assertIn("ETag", response)
+
+    def test_session_user_is_loaded_from_primary(self):
+        client = APIClient()
+        client.force_login(self.viewer)
+        self.lag_replica()
+        self.viewer.is_active = False
+        self.viewer.save()
+
+        response = client.get("/users/", format="json")
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+        response = client.get("/users/", format="json")
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
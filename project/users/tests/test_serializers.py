@@ -21,3 +21,11 @@ class CreateUserSerializerTest(TestCase):
 
         user = get_user_model().objects.exclude(email=settings.ANONYMOUS_USER_NAME).first()
         self.assertEqual("someone@somewhere.ca", user.email)
+
+    def test_rejects_email_taken_in_other_case(self):
+        get_user_model().objects.create_user(email="someone@somewhere.ca")
+        serializer = CustomUserSerializer(
+            data={"email": "Someone@Somewhere.ca", "password": "ohdangapassword"}
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors["email"][0].code, "unique")
@@ -0,0 +1,118 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory
+
+from users.models import CustomUser, RevokedToken
+from users.tokens import SignedTokenAuthentication, make_token
+
+
+class TokensTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.password = "9823475tyuegrfhjdksis"
+        self.user = CustomUser.objects.create_user(
+            email="client@duper.com", password=self.password
+        )
+        self.client = APIClient()
+
+    def tearDown(self):
+        cache.clear()
+
+    def mint(self):
+        response = self.client.post(
+            "/tokens/",
+            {"email": self.user.email, "password": self.password},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["token"]
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return SignedTokenAuthentication().authenticate(request)
+
+    def test_mint_and_use_token(self):
+        token = self.mint()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = self.client.get(f"/users/{self.user.uuid}/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_mint_rejects_bad_credentials(self):
+        response = self.client.post(
+            "/tokens/", {"email": self.user.email, "password": "nope"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_verified_without_database(self):
+        token = make_token(self.user)
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(token)
+        self.assertEqual(user, self.user)
+
+    def test_stale_stamp_loads_user(self):
+        token = make_token(self.user)
+        self.authenticate(token)
+        self.user.first_name = "Changed"
+        self.user.save()
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(token)
+        self.assertEqual(user.first_name, "Changed")
+
+    def test_deactivated_user_is_rejected(self):
+        token = make_token(self.user)
+        self.user.is_active = False
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = self.client.get(f"/users/{self.user.uuid}/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_tampered_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {make_token(self.user)}x")
+        response = self.client.post("/tokens/refresh/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(USERS_TOKEN_MAX_AGE=-1)
+    def test_expired_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {make_token(self.user)}")
+        response = self.client.post("/tokens/refresh/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_revokes_old_token(self):
+        token = self.mint()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = self.client.post("/tokens/refresh/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data["token"], token)
+
+        response = self.client.post("/tokens/refresh/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.mint()}")
+        response = self.client.post("/tokens/revoke/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.get(f"/users/{self.user.uuid}/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_revocation_outlives_the_cache(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.mint()}")
+        self.client.post("/tokens/revoke/")
+        # evicted, as it would be from a full memcached
+        cache.clear()
+        response = self.client.post("/tokens/refresh/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_prunes_expired_revocations(self):
+        expired = RevokedToken.objects.create(
+            jti="expired", expires=timezone.now() - timedelta(seconds=1)
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.mint()}")
+        self.client.post("/tokens/revoke/")
+        revoked = RevokedToken.objects.get()
+        self.assertNotEqual(revoked, expired)
+        self.assertGreater(revoked.expires, timezone.now())
@@ -1,10 +1,20 @@
+import csv
+import io
+import json
 import logging
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from guardian.shortcuts import assign_perm
 from rest_framework.test import APIClient
 
+from users.pagination import CustomUserCursorPagination
+
 logger = logging.getLogger(__name__)
 logging.disable(logging.NOTSET)
 logger.setLevel(logging.DEBUG)
@@ -57,7 +67,7 @@ class ListUsersTest(UsersTest):
     def test_non_admin_just_gets_self(self):
         self.login_as_user()
         result = self.client.get("/users/", format="json")
-        self.assertEqual(1, len(result.data))
+        self.assertEqual(1, len(result.data["results"]))
         self.assertContains(result, self.user.uuid)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
 
@@ -86,6 +96,220 @@ class ListUsersTest(UsersTest):
         result = self.client.get(f"/users/{self.admin_user.uuid}/", format="json")
         self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_filter_by_email_ignores_case(self):
+        self.login_as_admin()
+        result = self.client.get("/users/?email=36@09834.COM", format="json")
+        uuids = [user["uuid"] for user in result.data["results"]]
+        self.assertEqual(uuids, [str(self.user.uuid)])
+
+    def test_login_ignores_case(self):
+        self.assertTrue(
+            self.client.login(
+                username=self.user.email.upper(), password=self.user_password
+            )
+        )
+
+    def test_user_lists_users_granted_to_them(self):
+        other = get_user_model().objects.create_user(email="other@duper.com")
+        assign_perm("view_customuser", self.user, other)
+        self.login_as_user()
+        result = self.client.get("/users/", format="json")
+        uuids = {user["uuid"] for user in result.data["results"]}
+        self.assertEqual(uuids, {str(self.user.uuid), str(other.uuid)})
+
+        result = self.client.get(f"/users/{other.uuid}/", format="json")
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+
+    def test_user_lists_users_granted_to_their_groups(self):
+        other = get_user_model().objects.create_user(email="other@duper.com")
+        group = Group.objects.create(name="viewers")
+        self.user.groups.add(group)
+        assign_perm("view_customuser", group, other)
+        self.login_as_user()
+        result = self.client.get("/users/", format="json")
+        self.assertContains(result, other.uuid)
+
+    def test_list_query_count_does_not_grow_with_grants(self):
+        def list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get("/users/", format="json")
+            return len(queries)
+
+        self.login_as_user()
+        # the first request caches the user
+        list_queries()
+        before = list_queries()
+        for i in range(20):
+            other = get_user_model().objects.create_user(email=f"other{i}@duper.com")
+            assign_perm("view_customuser", self.user, other)
+        self.assertEqual(list_queries(), before)
+
+
+class PaginateUsersTest(UsersTest):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        get_user_model().objects.bulk_create_users(
+            [{"email": f"page{i}@ljkahsdbmfnas.com"} for i in range(5)]
+        )
+
+    def test_walks_all_users_newest_first(self):
+        self.login_as_admin()
+        url, seen = "/users/?limit=2", []
+        while url:
+            result = self.client.get(url, format="json")
+            self.assertEqual(result.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(result.data["results"]), 2)
+            seen.extend(user["uuid"] for user in result.data["results"])
+            url = result.data["next"]
+
+        expected = get_user_model().objects.order_by("-date_joined", "-uuid")
+        self.assertEqual(
+            seen, [str(uuid) for uuid in expected.values_list("uuid", flat=True)]
+        )
+
+    def test_limit_is_capped(self):
+        self.login_as_admin()
+        with mock.patch.object(CustomUserCursorPagination, "max_page_size", 3):
+            result = self.client.get("/users/?limit=100000", format="json")
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(result.data["results"]), 3)
+
+
+class SparseFieldsetsTest(UsersTest):
+    def test_list_only_renders_and_selects_requested_fields(self):
+        self.login_as_admin()
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get("/users/?fields=email", format="json")
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertTrue(result.data["results"])
+        for user in result.data["results"]:
+            self.assertEqual(list(user), ["email"])
+
+        (select,) = [q["sql"] for q in queries if "ORDER BY" in q["sql"]]
+        columns = select.split(" FROM ")[0]
+        self.assertIn('"users_customuser"."email"', columns)
+        self.assertNotIn('"users_customuser"."last_login"', columns)
+        self.assertNotIn('"users_customuser"."password"', columns)
+
+    def test_retrieve_only_renders_requested_fields(self):
+        self.login_as_user()
+        result = self.client.get(f"/users/{self.user.uuid}/?fields=uuid", format="json")
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data, {"uuid": str(self.user.uuid)})
+
+    def test_retrieve_with_fields_loads_no_deferred_field(self):
+        self.login_as_user()
+        url = f"/users/{self.user.uuid}/?fields=email"
+        self.client.get(url, format="json")
+        # the model permissions of the user and their groups, then the user
+        with self.assertNumQueries(3):
+            result = self.client.get(url, format="json")
+        self.assertEqual(result.data, {"email": self.user.email})
+
+    def test_rejects_write_only_fields(self):
+        self.login_as_admin()
+        result = self.client.get("/users/?fields=email,password", format="json")
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rejects_unknown_fields(self):
+        self.login_as_admin()
+        result = self.client.get("/users/?fields=is_superuser", format="json")
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportUsersTest(UsersTest):
+    def export(self, url):
+        result = self.client.get(url)
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertTrue(result.streaming)
+        return b"".join(result.streaming_content).decode()
+
+    def test_admin_exports_ndjson(self):
+        self.login_as_admin()
+        lines = self.export("/users/export/").splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(
+            {record["email"] for record in records},
+            set(get_user_model().objects.values_list("email", flat=True)),
+        )
+        self.assertEqual(set(records[0]), {"uuid", "email"})
+
+    def test_admin_exports_csv_with_fields(self):
+        self.login_as_admin()
+        rows = list(
+            csv.reader(io.StringIO(self.export("/users/export/?type=csv&fields=email")))
+        )
+        self.assertEqual(rows[0], ["email"])
+        self.assertEqual(len(rows) - 1, get_user_model().objects.count())
+
+    def test_user_only_exports_self(self):
+        self.login_as_user()
+        records = [
+            json.loads(line) for line in self.export("/users/export/").splitlines()
+        ]
+        self.assertEqual(
+            records, [{"uuid": str(self.user.uuid), "email": self.user.email}]
+        )
+
+    def test_rejects_unknown_type(self):
+        self.login_as_admin()
+        result = self.client.get("/users/export/?type=xml")
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_anon_user_cant_export(self):
+        result = self.client.get("/users/export/")
+        self.assertEqual(result.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ConditionalGetTest(UsersTest):
+    def test_retrieve_not_modified(self):
+        self.login_as_user()
+        url = f"/users/{self.user.uuid}/"
+        result = self.client.get(url, format="json")
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertIn("Last-Modified", result)
+
+        result = self.client.get(url, format="json", HTTP_IF_NONE_MATCH=result["ETag"])
+        self.assertEqual(result.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_modified_after_save(self):
+        self.login_as_user()
+        url = f"/users/{self.user.uuid}/"
+        etag = self.client.get(url, format="json")["ETag"]
+        self.user.first_name = "Changed"
+        self.user.save()
+
+        result = self.client.get(url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+
+    def test_list_not_modified_without_loading_rows(self):
+        self.login_as_admin()
+        etag = self.client.get("/users/", format="json")["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get("/users/", format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(result.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse([q for q in queries if "ORDER BY" in q["sql"]])
+
+    def test_list_modified_after_create(self):
+        self.login_as_admin()
+        etag = self.client.get("/users/", format="json")["ETag"]
+        get_user_model().objects.create_user(email="new@ljkahsdbmfnas.com")
+
+        result = self.client.get("/users/", format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+
+    def test_list_etag_differs_per_user(self):
+        self.login_as_admin()
+        admin_etag = self.client.get("/users/", format="json")["ETag"]
+        self.client.logout()
+        self.login_as_user()
+        result = self.client.get(
+            "/users/", format="json", HTTP_IF_NONE_MATCH=admin_etag
+        )
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+
 
 class CreateUserTest(UsersTest):
     def test_anon_user_can_create(self):
@@ -102,3 +326,39 @@ class CreateUserTest(UsersTest):
         self.assertEqual(
             get_user_model().objects.filter(email="237485jhdf@snmgflk.com").count(), 1
         )
+
+
+class BulkCreateUsersTest(UsersTest):
+    def test_admin_can_bulk_create(self):
+        self.login_as_admin()
+        result = self.client.post(
+            "/users/bulk/",
+            [
+                {"email": "bulk1@snmgflk.com", "password": "30945akhjudf"},
+                {"email": "bulk2@snmgflk.com", "password": "30945akhjudf"},
+            ],
+            format="json",
+        )
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(result.data), 2)
+        self.assertEqual(
+            get_user_model().objects.filter(email__startswith="bulk").count(), 2
+        )
+
+    def test_bulk_create_rejects_existing_email(self):
+        self.login_as_admin()
+        result = self.client.post(
+            "/users/bulk/",
+            [{"email": self.user.email, "password": "30945akhjudf"}],
+            format="json",
+        )
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_cant_bulk_create(self):
+        self.login_as_user()
+        result = self.client.post(
+            "/users/bulk/",
+            [{"email": "bulk1@snmgflk.com", "password": "30945akhjudf"}],
+            format="json",
+        )
+        self.assertEqual(result.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,134 @@
+"""
+Short-lived signed access tokens for API clients that don't keep a session.
+
+A token is the signed, timestamped payload of the user's pk and uuid, a random
+id and the version of the user it was minted at, see ``users.authentication``.
+It is checked against the signature, its age and the ``RevokedToken`` table,
+whose answer for each token is kept in the default cache. While the version
+still matches, the user comes from the cache too, so verification touches no
+database after a token's first use; a stale stamp means the user changed and
+is loaded again. An evicted answer is looked up again, so a revocation is never
+lost to the cache. Both lookups read the primary, as a lagging replica's answer
+would be cached too.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .authentication import get_user_version, version_key
+from .models import CustomUser, RevokedToken
+from .routers import reading_from_primary
+
+SALT = "users.tokens"
+
+
+def _revoked_key(token_id):
+    return f"users:tokens:revoked:{token_id}"
+
+
+def _user_key(pk):
+    return f"users:tokens:user:{pk}"
+
+
+def make_token(user):
+    """
+    Returns a new token for ``user``.
+    """
+    payload = {
+        "pk": user.pk,
+        "uuid": str(user.uuid),
+        "jti": uuid.uuid4().hex,
+        "stamp": get_user_version(user.pk),
+    }
+    return signing.dumps(payload, salt=SALT)
+
+
+def read_token(token):
+    """
+    Returns the payload of ``token``, raising ``signing.BadSignature`` if it
+    was tampered with, has expired or was revoked.
+    """
+    payload = signing.loads(token, salt=SALT, max_age=settings.USERS_TOKEN_MAX_AGE)
+    if is_revoked(payload["jti"]):
+        raise signing.BadSignature("Token revoked")
+    return payload
+
+
+def is_revoked(token_id):
+    key = _revoked_key(token_id)
+    revoked = cache.get(key)
+    if revoked is None:
+        with reading_from_primary():
+            revoked = RevokedToken.objects.filter(jti=token_id).exists()
+        # add, so a revocation stored meanwhile is not overwritten
+        cache.add(key, revoked, settings.USERS_TOKEN_MAX_AGE)
+    return revoked
+
+
+def revoke_token(payload):
+    now = timezone.now()
+    # it only needs to outlive the token
+    expires = now + timedelta(seconds=settings.USERS_TOKEN_MAX_AGE)
+    RevokedToken.objects.filter(expires__lt=now).delete()
+    RevokedToken.objects.get_or_create(
+        jti=payload["jti"], defaults={"expires": expires}
+    )
+    cache.set(_revoked_key(payload["jti"]), True, settings.USERS_TOKEN_MAX_AGE)
+
+
+def get_token_user(payload):
+    """
+    Returns the active user ``payload`` was minted for, or ``None``.
+    """
+    pk = payload["pk"]
+    cached = cache.get_many([version_key(pk), _user_key(pk)])
+    version = cached.get(version_key(pk))
+    entry = cached.get(_user_key(pk))
+    if version == payload["stamp"] and entry is not None and entry[0] == version:
+        return entry[1]
+
+    # a lagging replica's copy would be kept under the version read below
+    with reading_from_primary():
+        user = CustomUser._default_manager.filter(
+            pk=pk, uuid=payload["uuid"], is_active=True
+        ).first()
+    if user is not None:
+        version = get_user_version(pk)
+        cache.set(_user_key(pk), (version, user), settings.USERS_TOKEN_MAX_AGE)
+    return user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates requests carrying ``Authorization: Bearer <token>``.
+    """
+
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_("Invalid token header."))
+
+        try:
+            payload = read_token(auth[1].decode())
+        except (signing.BadSignature, UnicodeError):
+            raise exceptions.AuthenticationFailed(_("Invalid or expired token."))
+        user = get_token_user(payload)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return user, payload
+
+    def authenticate_header(self, request):
+        return self.keyword
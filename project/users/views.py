@@ -1,13 +1,48 @@
-from rest_framework.permissions import DjangoObjectPermissions
-from rest_framework.viewsets import ModelViewSet
+import csv
 
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    AllowAny,
+    DjangoObjectPermissions,
+    IsAuthenticated,
+)
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.views import APIView
+from rest_framework.viewsets import ModelViewSet, ViewSet
+
+from users import anonymous
+from users.checkers import CustomUserPermissionChecker
+from users.conditional import get_list_version, make_etag
+from users.metrics import CONTENT_TYPE, PrometheusRenderer, permission_checks, registry
 from users.models import CustomUser
-from users.serializers import CustomUserSerializer
+from users.pagination import CustomUserCursorPagination
+from users.routers import is_reading_from_replica
+from users.serializers import (
+    BulkCustomUserSerializer,
+    BulkGrantSerializer,
+    CustomUserSerializer,
+    TokenObtainSerializer,
+)
+from users.shortcuts import bulk_assign_perm, bulk_remove_perm, get_users_for_user
+from users.tokens import SignedTokenAuthentication, make_token, revoke_token
 
 
 class CustomObjectPermissions(DjangoObjectPermissions):
     """
     Similar to `DjangoObjectPermissions`, but adding 'view' permissions.
+
+    Views providing ``get_permission_checker`` share one checker across all
+    object checks of a request instead of going through ``user.has_perms``.
+    Unauthenticated requests get what guardian's anonymous user holds.
     """
 
     perms_map = {
@@ -20,6 +55,57 @@ class CustomObjectPermissions(DjangoObjectPermissions):
         "DELETE": ["%(app_label)s.delete_%(model_name)s"],
     }
 
+    def has_object_perms(self, request, view, perms, obj):
+        if not request.user.is_authenticated and not anonymous.has_object_grants():
+            return False
+        if hasattr(view, "get_permission_checker"):
+            return view.get_permission_checker().has_perms(perms, obj)
+        return request.user.has_perms(perms, obj)
+
+    def has_permission(self, request, view):
+        if request.user and not request.user.is_authenticated:
+            allowed = self.has_anonymous_permission(request, view)
+        else:
+            allowed = super().has_permission(request, view)
+        permission_checks.inc(check="model", decision="allow" if allowed else "deny")
+        return allowed
+
+    def has_anonymous_permission(self, request, view):
+        """
+        Returns whether guardian's anonymous user holds the model permissions
+        of the request, answered from memory by ``users.anonymous``.
+        """
+        model_cls = self._queryset(view).model
+        perms = self.get_required_permissions(request.method, model_cls)
+        return anonymous.has_perms(perms)
+
+    def has_object_permission(self, request, view, obj):
+        try:
+            allowed = self.check_object_permission(request, view, obj)
+        except Http404:
+            permission_checks.inc(check="object", decision="not_found")
+            raise
+        permission_checks.inc(check="object", decision="allow" if allowed else "deny")
+        return allowed
+
+    def check_object_permission(self, request, view, obj):
+        # authentication checks have already executed via has_permission
+        model_cls = self._queryset(view).model
+        perms = self.get_required_object_permissions(request.method, model_cls)
+
+        if not self.has_object_perms(request, view, perms, obj):
+            # Users without read permissions see a 404 rather than a 403.
+            if request.method in SAFE_METHODS:
+                raise Http404
+
+            read_perms = self.get_required_object_permissions("GET", model_cls)
+            if not self.has_object_perms(request, view, read_perms, obj):
+                raise Http404
+
+            return False
+
+        return True
+
 
 class CustomUserViewSet(ModelViewSet):
     """
@@ -30,11 +116,306 @@ class CustomUserViewSet(ModelViewSet):
     # must match exactly this regex pattern, including hyphens in their particular places
     lookup_value_regex = "[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
     serializer_class = CustomUserSerializer
+    pagination_class = CustomUserCursorPagination
+    # actions that accept ?fields= to narrow their output
+    sparse_fieldset_actions = ("list", "retrieve", "export")
+    export_chunk_size = 2000
 
     def get_queryset(self):
-        user = self.request.user
+        user = anonymous.resolve_user(self.request.user)
         if user.is_staff:
-            return CustomUser.objects.all()
-        return CustomUser.objects.filter(email=user.email)
+            queryset = CustomUser.objects.all()
+        else:
+            queryset = get_users_for_user(user, "view_customuser")
+
+        # ?email= finds a user whatever the case of the address
+        email = self.request.query_params.get("email")
+        if email is not None:
+            queryset = queryset.filter(email_lower=email.lower())
+
+        fields = self.get_requested_fields()
+        if fields is not None:
+            queryset = queryset.only(*self.get_projection(fields))
+        return queryset
+
+    def get_requested_fields(self):
+        """
+        Returns the field names asked for with ``?fields=``, or ``None`` for all of them.
+        """
+        if self.action not in self.sparse_fieldset_actions:
+            return None
+        if not hasattr(self, "_requested_fields"):
+            self._requested_fields = None
+            param = self.request.query_params.get("fields")
+            if param is not None:
+                self._requested_fields = self.validate_fields(param)
+        return self._requested_fields
+
+    def validate_fields(self, param):
+        fields = [name.strip() for name in param.split(",") if name.strip()]
+        readable = {
+            name
+            for name, field in self.get_serializer_class()().fields.items()
+            if not field.write_only
+        }
+        unknown = sorted(set(fields) - readable)
+        if unknown:
+            raise ValidationError(
+                {"fields": [f"Unknown fields: {', '.join(unknown)}."]}
+            )
+        if not fields:
+            raise ValidationError({"fields": ["At least one field is required."]})
+        return fields
+
+    def get_projection(self, fields):
+        """
+        Returns the model fields needed to render ``fields`` and paginate them.
+        """
+        serializer_fields = self.get_serializer_class()().fields
+        projection = [serializer_fields[name].source for name in fields]
+        # the lookup field, which retrieve reads for the ETag
+        projection.append(self.lookup_field)
+        projection.append("date_joined")
+        if self.action == "retrieve":
+            projection.append("modified")
+        return projection
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault("fields", fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_serializer_class(self):
+        if self.action == "bulk_create":
+            return BulkCustomUserSerializer
+        return super().get_serializer_class()
+
+    def get_permission_checker(self):
+        """
+        Returns the object permission checker shared by this request.
+        """
+        if not hasattr(self, "_permission_checker"):
+            self._permission_checker = CustomUserPermissionChecker(
+                anonymous.resolve_user(self.request.user)
+            )
+        return self._permission_checker
+
+    def get_not_modified_response(self, etag, last_modified):
+        """
+        Returns a 304 response if the client's copy is still current, else ``None``.
+        """
+        return get_conditional_response(
+            self.request,
+            etag=quote_etag(etag),
+            last_modified=int(last_modified.timestamp()),
+        )
+
+    def set_validators(self, response, etag, last_modified):
+        response["ETag"] = quote_etag(etag)
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = make_etag(
+            instance.uuid,
+            instance.modified.isoformat(),
+            request.accepted_media_type,
+            request.query_params.get("fields"),
+        )
+        not_modified = self.get_not_modified_response(etag, instance.modified)
+        if not_modified is not None:
+            return not_modified
+
+        serializer = self.get_serializer(instance)
+        return self.set_validators(Response(serializer.data), etag, instance.modified)
+
+    def list(self, request, *args, **kwargs):
+        # read before the rows, so changes made meanwhile invalidate the response
+        version, last_modified = get_list_version()
+        etag = make_etag(
+            version,
+            request.user.pk,
+            request.accepted_media_type,
+            request.get_full_path(),
+        )
+        not_modified = self.get_not_modified_response(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = self.get_requested_fields()
+        if fields is not None:
+            # visibility is decided by the query, so skip building instances
+            queryset = queryset.values(*self.get_projection(fields))
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(queryset if page is None else page, many=True)
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+        if is_reading_from_replica():
+            # the rows may predate the version, so clients must not keep them under it
+            return response
+        return self.set_validators(response, etag, last_modified)
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        """
+        Create a list of users in one transaction.
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        Stream every visible user as NDJSON (default) or, with ``?type=csv``, CSV.
+        """
+        export_type = request.query_params.get("type", "ndjson")
+        if export_type not in ("ndjson", "csv"):
+            raise ValidationError({"type": ["Expected 'ndjson' or 'csv'."]})
+
+        serializer = self.get_serializer()
+        fields = [field for field in serializer.fields.values() if not field.write_only]
+        queryset = self.get_queryset()
+        # rows are read after the middleware returns, so route them now
+        rows = (
+            queryset.using(queryset.db)
+            .order_by("pk")
+            .values(*[field.source for field in fields])
+            .iterator(chunk_size=self.export_chunk_size)
+        )
+        records = (serializer.to_representation(row) for row in rows)
+
+        if export_type == "csv":
+            names = [field.field_name for field in fields]
+            content = export_csv(names, records)
+            content_type = "text/csv"
+        else:
+            content = export_ndjson(records)
+            content_type = "application/x-ndjson"
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="users.{export_type}"'
+        return response
 
     permission_classes = [CustomObjectPermissions]
+
+
+class GrantViewSet(ViewSet):
+    """
+    Grants or revokes an object permission on many users at once, to staff only.
+    """
+
+    # uuids looked up per query, within SQLite's limit on parameters
+    uuid_batch_size = 500
+
+    def create(self, request):
+        """
+        Grant the permission on the selected users, skipping existing grants.
+        """
+        return self.apply(request, bulk_assign_perm)
+
+    @action(detail=False, methods=["post"])
+    def revoke(self, request):
+        """
+        Revoke the permission on the selected users.
+        """
+        return self.apply(request, bulk_remove_perm)
+
+    def apply(self, request, change):
+        serializer = BulkGrantSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target = serializer.get_target()
+        codename = serializer.validated_data["permission"]
+        with transaction.atomic():
+            changed = sum(
+                change(codename, target, queryset)
+                for queryset in serializer.get_querysets(self.uuid_batch_size)
+            )
+        return Response({"changed": changed})
+
+
+class TokenViewSet(ViewSet):
+    """
+    Mints, refreshes and revokes the signed access tokens of ``users.tokens``.
+    """
+
+    authentication_classes = [SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_permissions(self):
+        if self.action == "create":
+            return [AllowAny()]
+        return super().get_permissions()
+
+    def token_response(self, user, status_code=status.HTTP_200_OK):
+        return Response(
+            {"token": make_token(user), "expires_in": settings.USERS_TOKEN_MAX_AGE},
+            status=status_code,
+        )
+
+    def create(self, request):
+        """
+        Trade an email and password for a token.
+        """
+        serializer = TokenObtainSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        return self.token_response(
+            serializer.validated_data["user"], status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=["post"])
+    def refresh(self, request):
+        """
+        Trade the token of the request for a new one.
+        """
+        revoke_token(request.auth)
+        return self.token_response(request.user)
+
+    @action(detail=False, methods=["post"])
+    def revoke(self, request):
+        """
+        Revoke the token of the request.
+        """
+        revoke_token(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class Echo:
+    """
+    A file-like object whose ``write`` hands back the value, for streaming ``csv.writer`` output.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_ndjson(records):
+    encoder = JSONEncoder()
+    for record in records:
+        yield encoder.encode(record) + "\n"
+
+
+def export_csv(names, records):
+    writer = csv.DictWriter(Echo(), fieldnames=names)
+    yield writer.writerow(dict(zip(names, names)))
+    for record in records:
+        yield writer.writerow(record)
+
+
+class MetricsView(APIView):
+    """
+    The metrics of ``users.metrics`` for Prometheus, to staff only.
+    """
+
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request):
+        return Response(registry.render(), content_type=CONTENT_TYPE)